@@ -0,0 +1,96 @@
+"""Cost of autosave per edit, against saving the whole diagram.
+
+For each diagram size, times single-shape edits (move, recolor) with the
+journal on and off, a naive autosave that saves the whole diagram, and the
+part of a journal compaction that runs on the GUI thread. With the journal
+the cost of an edit should not grow with the diagram.
+
+    python benchmarks/bench_autosave.py
+    python benchmarks/bench_autosave.py --sizes 1000 100000 --edits 2000
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from bench_interaction import syntheticDocument
+
+SIZES = [1000, 100000]
+EDITS = 1000
+
+
+def timeEdits(scene, shapes, edits):
+    """Median milliseconds per pushed command, alternating moves and recolors."""
+    from commands import MoveItemsCommand, RecolorItemsCommand
+
+    samples = []
+    for i in range(edits):
+        shape = shapes[i % len(shapes)]
+        if i % 2:
+            command = RecolorItemsCommand(scene, [shape], 0xff000000 | (i * 2654435761 & 0xffffff))
+        else:
+            command = MoveItemsCommand(scene, [shape], 1.0, 1.0, i)  # a new drag each time
+        start = time.perf_counter()
+        scene.pushCommand(command)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def runSize(item_count, edits, directory):
+    from PyQt5.QtWidgets import QGraphicsRectItem
+    from document import save_any
+    from main_qt import FlowchartScene
+
+    scene = FlowchartScene()
+    scene.loadDocument(syntheticDocument(item_count))
+    shapes = [item for item in scene.items() if isinstance(item, QGraphicsRectItem)]
+    timeEdits(scene, shapes, edits)  # warm up
+    plain_ms = timeEdits(scene, shapes, edits)
+
+    start = time.perf_counter()
+    save_any(scene.toDocument(), os.path.join(directory, 'full.flow'))
+    full_save_ms = (time.perf_counter() - start) * 1000
+
+    from journal import Journal
+
+    scene.journal = Journal(os.path.join(directory, 'autosave'))
+    journal_ms = timeEdits(scene, shapes, edits)
+    bytes_per_edit = scene.journal.journal_bytes / edits
+    start = time.perf_counter()
+    scene.journal.snapshot(scene.toDocument())
+    snapshot_ms = (time.perf_counter() - start) * 1000
+    scene.journal.close(discard=True)
+    scene.journal = None
+    scene.clearDiagram()
+    return plain_ms, journal_ms, bytes_per_edit, full_save_ms, snapshot_ms
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-edit autosave cost of the Qt editor.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help="diagram sizes in items")
+    parser.add_argument('--edits', type=int, default=EDITS, help="edits timed per size")
+    args = parser.parse_args(argv)
+
+    from PyQt5.QtWidgets import QApplication
+
+    app = QApplication(sys.argv[:1])
+    directory = tempfile.mkdtemp(prefix='flowchart_autosave_')
+    print(f"{'items':>7} {'edit ms':>8} {'journaled ms':>13} {'bytes/edit':>11} {'full save ms':>13} {'snapshot ms':>12}")
+    try:
+        for size in args.sizes:
+            plain_ms, journal_ms, bytes_per_edit, full_save_ms, snapshot_ms = runSize(size, args.edits, directory)
+            print(f"{size:>7} {plain_ms:>8.3f} {journal_ms:>13.3f} {bytes_per_edit:>11.0f} {full_save_ms:>13.1f} "
+                  f"{snapshot_ms:>12.1f}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    del app
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import Qt, QLineF, QRectF
+from PyQt5.QtGui import QPen, QPainter, QImage
+
+from main_qt import FlowchartScene, FlowchartView
+
+WIDTH, HEIGHT = 3840, 2160
+ZOOM_LEVELS = [2.0, 1.0, 0.5, 0.25, 0.1]
+REPAINTS = 20
+
+
+def drawLegacyGrid(painter, rect, grid_size):
+    # The per-frame QLineF list the view used before the cached grid brush.
+    left = int(rect.left()) - (int(rect.left()) % grid_size)
+    top = int(rect.top()) - (int(rect.top()) % grid_size)
+    right = int(rect.right())
+    bottom = int(rect.bottom())
+
+    lines = []
+    for x in range(left, right, grid_size):
+        lines.append(QLineF(x, top, x, bottom))
+    for y in range(top, bottom, grid_size):
+        lines.append(QLineF(left, y, right, y))
+
+    painter.setPen(QPen(Qt.lightGray))
+    painter.drawLines(lines)
+
+
+def timeRepaints(view, zoom, draw):
+    image = QImage(WIDTH, HEIGHT, QImage.Format_ARGB32_Premultiplied)
+    rect = QRectF(0, 0, WIDTH / zoom, HEIGHT / zoom)
+    start = time.perf_counter()
+    for i in range(REPAINTS):
+        image.fill(Qt.white)
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.scale(zoom, zoom)
+        # Shift the exposed rect a little each frame, as a pan would.
+        draw(painter, rect.translated(i * 7.5, i * 3.5))
+        painter.end()
+    return (time.perf_counter() - start) / REPAINTS * 1000
+
+
+def main():
+    app = QApplication(sys.argv)
+    view = FlowchartView(FlowchartScene())
+    view.resize(WIDTH, HEIGHT)
+
+    print(f"{'zoom':>6} {'legacy ms':>10} {'cached ms':>10} {'speedup':>8}")
+    for zoom in ZOOM_LEVELS:
+        view.resetTransform()
+        view.scale(zoom, zoom)
+        legacy = timeRepaints(view, zoom, lambda painter, rect: drawLegacyGrid(painter, rect, view.grid_size))
+        cached = timeRepaints(view, zoom, view.drawBackground)
+        print(f"{zoom:>6} {legacy:>10.2f} {cached:>10.2f} {legacy / cached:>7.1f}x")
+    del app  # keeps the QApplication referenced until the benchmark is done
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QPointF, QRectF
+from PyQt5.QtGui import QColor, QPen, QTransform
+
+from main_qt import FlowchartScene, FlowchartView
+
+ITEM_COUNTS = [1000, 10000, 100000]
+COLUMNS = 300
+
+
+def generatedDiagram(shape_count, seed=1):
+    # A grid of shapes in three kinds and colors, each connected to the
+    # previous one, as a script generating a diagram might produce.
+    rng = np.random.default_rng(seed)
+    index = np.arange(shape_count)
+    geometry = np.column_stack((index % COLUMNS * 150.0, index // COLUMNS * 100.0,
+                                np.full(shape_count, 100.0), np.full(shape_count, 60.0)))
+    kinds = index % 3
+    strokes = rng.choice([0xff000000, 0xffcc0000, 0xff0000cc], shape_count)
+    connectors = np.column_stack((index[:-1], index[1:]))
+    return kinds, geometry, strokes, connectors
+
+
+def insertOneByOne(scene, kinds, geometry, strokes, connectors):
+    # What addShape and loadDocument did before the bulk API.
+    shapes = []
+    for kind, (x, y, width, height), stroke in zip(kinds.tolist(), geometry.tolist(), strokes.tolist()):
+        shape = scene.createShapeItem(('rect', 'ellipse', 'diamond')[kind], QRectF(x, y, width, height))
+        shape.setPen(QPen(QColor.fromRgba(stroke), 2))
+        scene.addItem(shape)
+        shapes.append(shape)
+    for source, target in connectors.tolist():
+        scene.addConnector(shapes[source], shapes[target])
+
+
+def insertBulk(scene, kinds, geometry, strokes, connectors):
+    scene.addShapes(kinds, geometry, strokes, connectors=connectors)
+
+
+def timeInsert(app, insert, diagram):
+    scene = FlowchartScene()
+    view = FlowchartView(scene)
+    view.resize(1280, 800)
+    view.show()
+    app.processEvents()
+    start = time.perf_counter()
+    insert(scene, *diagram)
+    # Let the view repaint and the index build, as the first click would.
+    app.processEvents()
+    scene.itemAt(QPointF(10, 10), QTransform())
+    elapsed = time.perf_counter() - start
+    item_count = len(scene.items())
+    view.close()
+    scene.clearDiagram()
+    return elapsed, item_count
+
+
+def main():
+    app = QApplication(sys.argv)
+    print(f"{'shapes':>7} {'items':>7} {'one by one s':>13} {'bulk s':>8} {'speedup':>8}")
+    for shape_count in ITEM_COUNTS:
+        diagram = generatedDiagram(shape_count)
+        single, item_count = timeInsert(app, insertOneByOne, diagram)
+        bulk, bulk_count = timeInsert(app, insertBulk, diagram)
+        assert bulk_count == item_count
+        print(f"{shape_count:>7} {item_count:>7} {single:>13.2f} {bulk:>8.2f} {single / bulk:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
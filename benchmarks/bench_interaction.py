@@ -0,0 +1,330 @@
+"""Replay scripted mouse interactions against both front ends.
+
+Each (front end, size) case runs in its own process so memory figures are
+not polluted by earlier cases. A case builds a synthetic diagram, replays
+drawing, dragging, wheel-zoom and line drawing/snapping sequences, and
+reports per-event latency (event delivery plus the repaint it triggers)
+and memory. Each case runs --repeat times and the best figures are kept,
+as single runs of a few dozen events are noisy. Qt runs on the offscreen
+platform. Tk needs a display; without one its cases are reported as
+skipped.
+
+Orthogonal connector routing is turned off in the Qt app so the numbers
+measure the editor itself; bench_routing.py covers routing.
+
+    python benchmarks/bench_interaction.py --save-baseline benchmarks/interaction_baseline.json
+    python benchmarks/bench_interaction.py --baseline benchmarks/interaction_baseline.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from document import Document
+
+SIZES = [100, 1000, 10000, 100000]
+FRONTENDS = ['qt', 'tk']
+COLUMNS = 100
+PITCH_X, PITCH_Y = 150, 100
+SHAPE_W, SHAPE_H = 100, 60
+VIEW_W, VIEW_H = 1280, 800
+MOVES = 30
+WHEEL_TICKS = 20
+REPEATS = 3
+
+# A regression must exceed both the relative tolerance and these absolute
+# floors, so timer noise on fast events is not reported.
+LATENCY_FLOOR_MS = 0.5
+MEMORY_FLOOR_MB = 5.0
+
+
+def syntheticDocument(item_count):
+    """Half shapes on a grid, 40% connectors between neighbours, 10% lines."""
+    document = Document()
+    shape_count = max(2, item_count // 2)
+    for i in range(shape_count):
+        document.add_shape(('rect', 'ellipse', 'diamond')[i % 3], i % COLUMNS * PITCH_X, i // COLUMNS * PITCH_Y,
+                           SHAPE_W, SHAPE_H, fill=0xffadd8e6)
+    for i in range(min(item_count * 4 // 10, shape_count - 1)):
+        neighbour = i + COLUMNS if i + COLUMNS < shape_count else i + 1
+        document.add_connector(i, min(neighbour, shape_count - 1))
+    for i in range(item_count // 10):
+        # Short lines in the gaps between shapes, for snapping.
+        x, y = i % COLUMNS * PITCH_X + SHAPE_W + 10, i // COLUMNS * PITCH_Y + 10
+        document.add_line(x, y, x + 30, y + 40)
+    return document
+
+
+def memoryMB():
+    """(current, peak) resident set size in MB, None where unavailable."""
+    current = None
+    try:
+        with open('/proc/self/statm') as f:
+            current = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    peak = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    return current, peak
+
+
+def latencyStats(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {'events': 0}
+
+    def percentile(fraction):
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1000
+
+    return {'events': len(samples), 'p50_ms': percentile(0.5), 'p99_ms': percentile(0.99), 'max_ms': samples[-1] * 1000}
+
+
+def runQt(item_count):
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtCore import QEvent, QPoint, QPointF, Qt
+    from PyQt5.QtGui import QMouseEvent, QWheelEvent
+    from PyQt5.QtTest import QTest
+    from main_qt import FlowchartApp
+
+    app = QApplication(sys.argv[:1])
+    window = FlowchartApp()
+    window.routing_button.setChecked(False)
+    window.resize(VIEW_W, VIEW_H)
+    window.show()
+    QTest.qWaitForWindowExposed(window)
+    scene, view = window.scene, window.view
+    viewport = view.viewport()
+
+    start = time.perf_counter()
+    scene.loadDocument(syntheticDocument(item_count))
+    app.processEvents()
+    build = time.perf_counter() - start
+
+    def timed(samples, action):
+        start = time.perf_counter()
+        action()
+        app.processEvents()
+        samples.append(time.perf_counter() - start)
+
+    def move(pos):
+        event = QMouseEvent(QEvent.MouseMove, QPointF(pos), Qt.NoButton, Qt.LeftButton, Qt.NoModifier)
+        return lambda: app.sendEvent(viewport, event)
+
+    def gesture(mode, scene_x, scene_y, dx, dy):
+        # Press, MOVES moves and release, starting at a scene point.
+        scene.setMode(mode)
+        view.centerOn(scene_x, scene_y)
+        app.processEvents()
+        origin = view.mapFromScene(QPointF(scene_x, scene_y))
+        samples = []
+        timed(samples, lambda: QTest.mousePress(viewport, Qt.LeftButton, Qt.NoModifier, origin))
+        for step in range(1, MOVES + 1):
+            timed(samples, move(origin + QPoint(dx * step, dy * step)))
+        timed(samples, lambda: QTest.mouseRelease(viewport, Qt.LeftButton, Qt.NoModifier, origin + QPoint(dx * MOVES, dy * MOVES)))
+        scene.clearSelection()
+        return samples
+
+    middle = item_count // 4  # a shape in the middle of the grid
+    shape_x = middle % COLUMNS * PITCH_X
+    shape_y = middle // COLUMNS * PITCH_Y
+    # Warm up fonts, pixmap caches and the first paints, then undo.
+    gesture('rectangle', shape_x + SHAPE_W + 25, shape_y + SHAPE_H + 20, 3, 2)
+    scene.undo_stack.undo()
+    scenarios = {
+        'draw': gesture('rectangle', shape_x + SHAPE_W + 25, shape_y + SHAPE_H + 20, 3, 2),
+        # Off-centre: straight connectors run through the shape's centre.
+        'drag': gesture('select', shape_x + SHAPE_W / 4, shape_y + SHAPE_H / 2, 4, 3),
+        'line': gesture('line', shape_x + SHAPE_W + 10, shape_y + 10, 2, 5),
+    }
+
+    samples = []
+    centre = QPointF(VIEW_W / 2, VIEW_H / 2)
+    for tick in range(WHEEL_TICKS):
+        delta = 120 if tick % 4 < 2 else -120
+        event = QWheelEvent(centre, view.mapToGlobal(centre.toPoint()), QPoint(), QPoint(0, delta),
+                            Qt.NoButton, Qt.ControlModifier, Qt.NoScrollPhase, False)
+        timed(samples, lambda: app.sendEvent(viewport, event))
+    scenarios['wheel_zoom'] = samples
+    return build, scenarios
+
+
+def runTk(item_count):
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError as error:
+        return None, str(error)
+    from main_tkinter import FlowchartApp
+
+    root.geometry(f"{VIEW_W}x{VIEW_H}")
+    app = FlowchartApp(root)
+    canvas = app.canvas
+    root.update()
+
+    start = time.perf_counter()
+    app.load_document(syntheticDocument(item_count))
+    root.update()
+    build = time.perf_counter() - start
+
+    def timed(samples, action):
+        start = time.perf_counter()
+        action()
+        root.update()
+        samples.append(time.perf_counter() - start)
+
+    def gesture(shape, world_x, world_y, dx, dy):
+        app.current_shape = shape
+        x, y = app.view.to_canvas((world_x, world_y))
+        x, y = int(x - canvas.canvasx(0)), int(y - canvas.canvasy(0))
+        samples = []
+        timed(samples, lambda: canvas.event_generate('<Button-1>', x=x, y=y))
+        for step in range(1, MOVES + 1):
+            timed(samples, lambda: canvas.event_generate('<B1-Motion>', x=x + dx * step, y=y + dy * step))
+        timed(samples, lambda: canvas.event_generate('<ButtonRelease-1>', x=x + dx * MOVES, y=y + dy * MOVES))
+        return samples
+
+    # The Tk front end draws near the top-left of the diagram; it cannot
+    # scroll to the middle or move shapes, so it has no drag scenario.
+    scenarios = {
+        'draw': gesture('rectangle', SHAPE_W + 25, SHAPE_H + 20, 3, 2),
+        'line': gesture('line', SHAPE_W + 10, 10, 2, 5),
+    }
+
+    samples = []
+    for tick in range(WHEEL_TICKS):
+        delta = 120 if tick % 4 < 2 else -120
+
+        def wheel():
+            canvas.event_generate('<MouseWheel>', delta=delta, x=VIEW_W // 2, y=VIEW_H // 2)
+            # Zoom is applied by a 16 ms timer; wait for it like a frame would.
+            time.sleep(0.016)
+        timed(samples, wheel)
+    scenarios['wheel_zoom'] = samples
+    root.destroy()
+    return build, scenarios
+
+
+def runCase(frontend, item_count):
+    """Run one case in this process and return its result dictionary."""
+    result = {'frontend': frontend, 'items': item_count}
+    build, scenarios = (runQt if frontend == 'qt' else runTk)(item_count)
+    if build is None:
+        result['skipped'] = scenarios
+        return result
+    current, peak = memoryMB()
+    result['build_s'] = build
+    result['rss_mb'] = current
+    result['peak_rss_mb'] = peak
+    result['scenarios'] = {name: latencyStats(samples) for name, samples in scenarios.items()}
+    return result
+
+
+def spawnCase(frontend, item_count):
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--case', frontend, str(item_count)],
+                               capture_output=True, text=True)
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        return {'frontend': frontend, 'items': item_count,
+                'skipped': f"case failed: {completed.stderr.strip().splitlines()[-1:] or completed.returncode}"}
+    return json.loads(lines[-1])
+
+
+def bestOf(runs):
+    """Merge repeated runs of one case, keeping the lowest value of each metric."""
+    completed = [run for run in runs if 'skipped' not in run]
+    if not completed:
+        return runs[0]
+    best = dict(completed[0], scenarios={})
+    for key in ('build_s', 'rss_mb', 'peak_rss_mb'):
+        values = [run[key] for run in completed if run[key] is not None]
+        best[key] = min(values) if values else None
+    for name in completed[0]['scenarios']:
+        stats = [run['scenarios'][name] for run in completed]
+        best['scenarios'][name] = {metric: min(entry[metric] for entry in stats) for metric in stats[0]}
+    return best
+
+
+def compare(results, baseline, tolerance):
+    """Return human-readable regressions of `results` against `baseline`."""
+    previous = {(entry['frontend'], entry['items']): entry for entry in baseline.get('results', [])}
+    regressions = []
+    for entry in results:
+        old = previous.get((entry['frontend'], entry['items']))
+        if old is None or 'skipped' in entry or 'skipped' in old:
+            continue
+        label = f"{entry['frontend']} {entry['items']} items"
+        for name, stats in entry['scenarios'].items():
+            old_stats = old['scenarios'].get(name, {})
+            for metric in ('p50_ms', 'p99_ms'):
+                new_value, old_value = stats.get(metric), old_stats.get(metric)
+                if new_value is None or old_value is None:
+                    continue
+                if new_value > old_value * (1 + tolerance) and new_value - old_value > LATENCY_FLOOR_MS:
+                    regressions.append(f"{label} {name} {metric}: {old_value:.2f} -> {new_value:.2f}")
+        new_value, old_value = entry.get('peak_rss_mb'), old.get('peak_rss_mb')
+        if new_value and old_value and new_value > old_value * (1 + tolerance) and new_value - old_value > MEMORY_FLOOR_MB:
+            regressions.append(f"{label} peak RSS MB: {old_value:.1f} -> {new_value:.1f}")
+    return regressions
+
+
+def printResults(results):
+    print(f"{'front':<5} {'items':>7} {'build s':>8} {'peak MB':>8}  {'scenario':<11} {'events':>6} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for entry in results:
+        if 'skipped' in entry:
+            print(f"{entry['frontend']:<5} {entry['items']:>7}  skipped: {entry['skipped']}")
+            continue
+        peak = f"{entry['peak_rss_mb']:.1f}" if entry['peak_rss_mb'] is not None else "n/a"
+        for i, (name, stats) in enumerate(entry['scenarios'].items()):
+            prefix = (f"{entry['frontend']:<5} {entry['items']:>7} {entry['build_s']:>8.2f} {peak:>8}" if i == 0
+                      else " " * 31)
+            print(f"{prefix}  {name:<11} {stats['events']:>6} {stats['p50_ms']:>8.2f} {stats['p99_ms']:>8.2f} "
+                  f"{stats['max_ms']:>8.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scripted interaction benchmarks for the Qt and Tk front ends.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help="diagram sizes in items")
+    parser.add_argument('--frontends', nargs='+', choices=FRONTENDS, default=FRONTENDS)
+    parser.add_argument('--baseline', help="baseline JSON to compare against; exits 1 on regressions")
+    parser.add_argument('--save-baseline', help="write the results to this JSON file")
+    parser.add_argument('--repeat', type=int, default=REPEATS, help="runs per case, best kept (default 3)")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative slowdown (default 0.25)")
+    parser.add_argument('--case', nargs=2, metavar=('FRONTEND', 'ITEMS'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case:
+        print(json.dumps(runCase(args.case[0], int(args.case[1]))))
+        return 0
+
+    results = [bestOf([spawnCase(frontend, size) for _ in range(max(1, args.repeat))])
+               for frontend in args.frontends for size in args.sizes]
+    printResults(results)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version.split()[0], 'platform': sys.platform, 'results': results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("no regressions against the baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from layout import force_layout, layered_layout
+
+NODE_COUNTS = [100, 1000, 10000]
+NODE_SIZE = (100.0, 60.0)
+
+
+def flowchartGraph(node_count, seed=1):
+    # A random tree, like a branching flowchart, plus 10% cross links that
+    # may introduce cycles.
+    rng = np.random.default_rng(seed)
+    edges = [(int(rng.integers(0, i)), i) for i in range(1, node_count)]
+    edges += [(int(a), int(b)) for a, b in rng.integers(0, node_count, (node_count // 10, 2))]
+    return edges, np.tile(NODE_SIZE, (node_count, 1))
+
+
+def overlaps(positions, sizes):
+    # Overlapping pairs, counted with a sweep over x.
+    order = np.argsort(positions[:, 0])
+    count = 0
+    for i, a in enumerate(order):
+        for b in order[i + 1:]:
+            if positions[b, 0] >= positions[a, 0] + sizes[a, 0]:
+                break
+            if positions[b, 1] < positions[a, 1] + sizes[a, 1] and positions[a, 1] < positions[b, 1] + sizes[b, 1]:
+                count += 1
+    return count
+
+
+def main():
+    print(f"{'nodes':>6} {'layout':>8} {'seconds':>8} {'width':>10} {'height':>10} {'overlaps':>9}")
+    for node_count in NODE_COUNTS:
+        edges, sizes = flowchartGraph(node_count)
+        for name, run in (('layered', layered_layout), ('force', force_layout)):
+            start = time.perf_counter()
+            positions = run(node_count, edges, sizes)
+            elapsed = time.perf_counter() - start
+            width, height = (positions + sizes).max(axis=0)
+            print(f"{node_count:>6} {name:>8} {elapsed:>8.2f} {width:>10.0f} {height:>10.0f} {overlaps(positions, sizes):>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+from PyQt5.QtWidgets import QApplication
+
+from main_qt import FlowchartScene
+
+SHAPE_COUNTS = [1000, 10000]
+COLUMNS = 100
+DRAG_FRAMES = 60
+
+
+def gridDiagram(shape_count, seed=1):
+    # Shapes on a loose grid, each connected to a random shape up to three
+    # columns and rows away, so most routes have to get around others.
+    rng = np.random.default_rng(seed)
+    index = np.arange(shape_count)
+    geometry = np.column_stack((index % COLUMNS * 200.0 + rng.uniform(0, 60, shape_count),
+                                index // COLUMNS * 160.0 + rng.uniform(0, 60, shape_count),
+                                np.full(shape_count, 100.0), np.full(shape_count, 60.0)))
+    offsets = rng.integers(-3, 4, (shape_count, 2))
+    column = np.clip(index % COLUMNS + offsets[:, 0], 0, COLUMNS - 1)
+    row = np.clip(index // COLUMNS + offsets[:, 1], 0, (shape_count - 1) // COLUMNS)
+    targets = np.minimum(row * COLUMNS + column, shape_count - 1)
+    keep = targets != index
+    return index % 3, geometry, np.column_stack((index[keep], targets[keep]))
+
+
+def main():
+    app = QApplication(sys.argv)
+    print(f"{'shapes':>7} {'routes':>7} {'route all s':>12} {'ms/route':>9} "
+          f"{'drag ms p50':>12} {'drag ms max':>12} {'straight/frame':>15} {'settle s':>9}")
+    for shape_count in SHAPE_COUNTS:
+        kinds, geometry, connectors = gridDiagram(shape_count)
+        scene = FlowchartScene()
+        scene.addShapes(kinds, geometry, connectors=connectors)
+
+        scene.route_budget = float('inf')
+        start = time.perf_counter()
+        scene.setOrthogonalRouting(True)
+        route_all = time.perf_counter() - start
+        routed = sum(1 for connector in scene.lines if connector.route is not None)
+        scene.route_budget = 0.008
+
+        # Drag a shape from the middle of the diagram across its neighbours,
+        # one moveItemsBy per frame as a mouse drag would.
+        shape = scene.lines[len(scene.lines) // 2].start_item
+        frame_times = []
+        straight = []
+        for frame in range(DRAG_FRAMES):
+            start = time.perf_counter()
+            scene.moveItemsBy([shape], 12, 7)
+            frame_times.append(time.perf_counter() - start)
+            straight.append(sum(1 for connector in scene.pending_routes if connector.route is None))
+        start = time.perf_counter()
+        while scene.pending_routes:
+            scene.routePending()
+        settle = time.perf_counter() - start
+
+        print(f"{shape_count:>7} {routed:>7} {route_all:>12.2f} {route_all / len(scene.lines) * 1000:>9.2f} "
+              f"{np.median(frame_times) * 1000:>12.2f} {max(frame_times) * 1000:>12.2f} "
+              f"{np.mean(straight):>15.1f} {settle:>9.3f}")
+        scene.clearDiagram()
+    del app  # keeps the QApplication referenced until the benchmark is done
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Cold-start time of the Qt editor, from launch to the first paint.
+
+Launches the editor with --startup-time, which quits right after the
+diagram view first paints, and measures from the moment the process was
+spawned. That includes interpreter start-up, or unpacking for a frozen
+build, which the editor cannot time itself.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --exe dist/main_qt/main_qt --exe dist/main_qt
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+RUNS = 10
+
+
+def launch(command, report_path):
+    environment = dict(os.environ)
+    environment.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    spawned = time.time()
+    subprocess.run(command + [f'--startup-time={report_path}'], env=environment, check=True, timeout=120)
+    with open(report_path, encoding='utf-8') as f:
+        report = json.load(f)
+    os.remove(report_path)
+    return (report['first_paint_time'] - spawned) * 1000, report['first_paint_ms'], report['steps_ms']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time from launch to the first paint of the Qt editor.")
+    parser.add_argument('--exe', action='append', default=[],
+                        help="frozen executable to time instead of main_qt.py; may be repeated")
+    parser.add_argument('--runs', type=int, default=RUNS)
+    args = parser.parse_args(argv)
+
+    commands = [[path] for path in args.exe] or [[sys.executable, os.path.join(ROOT, 'main_qt.py')]]
+    report_path = os.path.join(tempfile.gettempdir(), f'flowchart_startup_{os.getpid()}.json')
+    print(f"{'target':<40} {'launch->paint ms':>17} {'in-process ms':>14} {'imports ms':>11}")
+    for command in commands:
+        launch(command, report_path)  # warm the file system cache
+        runs = [launch(command, report_path) for _ in range(args.runs)]
+        total = statistics.median(run[0] for run in runs)
+        in_process = statistics.median(run[1] for run in runs)
+        imports = statistics.median(run[2].get('imports', 0.0) for run in runs)
+        print(f"{os.path.basename(command[-1]):<40} {total:>17.0f} {in_process:>14.0f} {imports:>11.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+from PyQt5.QtCore import QLineF, QRectF
+from PyQt5.QtGui import QColor
+from PyQt5.QtWidgets import QGraphicsLineItem, QGraphicsTextItem, QUndoCommand
+
+MOVE_COMMAND_ID = 1
+RESIZE_COMMAND_ID = 2
+
+# Rough memory estimates used to cap the undo history.
+COMMAND_COST = 256
+ITEM_REFERENCE_COST = 16
+RETAINED_ITEM_COST = 1024  # a removed item kept alive so it can be restored
+
+
+def itemGeometry(item):
+    if isinstance(item, QGraphicsLineItem):
+        line = item.line()
+        return (line.x1(), line.y1(), line.x2(), line.y2())
+    rect = item.rect()
+    return (rect.x(), rect.y(), rect.width(), rect.height())
+
+
+def setItemGeometry(item, geometry):
+    if isinstance(item, QGraphicsLineItem):
+        item.setLine(QLineF(*geometry))
+    else:
+        item.setRect(QRectF(*geometry))
+
+
+def itemColor(item):
+    if isinstance(item, QGraphicsTextItem):
+        return item.defaultTextColor().rgba()
+    return item.pen().color().rgba()
+
+
+def setItemColor(item, rgba):
+    if isinstance(item, QGraphicsTextItem):
+        item.setDefaultTextColor(QColor.fromRgba(rgba))
+    else:
+        pen = item.pen()
+        pen.setColor(QColor.fromRgba(rgba))
+        item.setPen(pen)
+
+
+def commandCost(command):
+    if isinstance(command, SceneCommand):
+        return command.cost()
+    # Macros are plain QUndoCommands holding SceneCommand children.
+    return COMMAND_COST + sum(commandCost(command.child(i)) for i in range(command.childCount()))
+
+
+def releaseCommand(command):
+    if isinstance(command, SceneCommand):
+        command.release()
+    else:
+        for i in range(command.childCount()):
+            releaseCommand(command.child(i))
+    command.setObsolete(True)
+
+
+class SceneCommand(QUndoCommand):
+    """Undoable change to a FlowchartScene.
+
+    With applied=True the change has already been made interactively, so the
+    redo() that QUndoStack.push() performs is skipped.
+
+    After every redo and undo the scene journals the touchedItems(); what it
+    records for them depends on journal_change: 'presence' (added or
+    removed), 'move', 'resize' or 'recolor'.
+    """
+
+    journal_change = None
+
+    def __init__(self, scene, text, applied=False):
+        super().__init__(text)
+        self.scene = scene
+        self.applied = applied
+        self.released = False
+
+    def redo(self):
+        if self.applied:
+            self.applied = False
+        elif self.released:
+            return
+        else:
+            self.apply()
+        self.scene.journalItems(self.journal_change, self.touchedItems())
+
+    def undo(self):
+        if not self.released:
+            self.revert()
+            self.scene.journalItems(self.journal_change, self.touchedItems())
+
+    def apply(self):
+        raise NotImplementedError
+
+    def revert(self):
+        raise NotImplementedError
+
+    def touchedItems(self):
+        return ()
+
+    def cost(self):
+        return COMMAND_COST
+
+    def release(self):
+        # Drop the payload of a command that fell off the end of the
+        # memory-capped history; it can no longer be undone.
+        self.released = True
+
+
+class AddItemsCommand(SceneCommand):
+    journal_change = 'presence'
+
+    def __init__(self, scene, items, text="Add", applied=False):
+        super().__init__(scene, text, applied)
+        self.items = tuple(items)
+
+    def apply(self):
+        for item in self.items:
+            self.scene.addItem(item)
+
+    def revert(self):
+        for item in reversed(self.items):
+            self.scene.removeItem(item)
+
+    def touchedItems(self):
+        return self.items
+
+    def cost(self):
+        return COMMAND_COST + ITEM_REFERENCE_COST * len(self.items)
+
+    def release(self):
+        super().release()
+        self.items = ()
+
+
+class DeleteItemsCommand(SceneCommand):
+    journal_change = 'presence'
+
+    def __init__(self, scene, items, text="Delete"):
+        super().__init__(scene, text)
+        items = list(items)
+        connectors = {connector for item in items for connector in scene.connectors_by_item.get(item, ())}
+        self.connectors = tuple(connectors.union(item for item in items if item in scene.lines))
+        self.items = tuple(item for item in items if item not in self.connectors)
+
+    def apply(self):
+        for connector in self.connectors:
+            self.scene.removeConnector(connector)
+        for item in self.items:
+            self.scene.removeItem(item)
+
+    def revert(self):
+        for item in self.items:
+            self.scene.addItem(item)
+        for connector in self.connectors:
+            self.scene.addConnectorItem(connector)
+
+    def touchedItems(self):
+        return self.items + self.connectors
+
+    def cost(self):
+        return COMMAND_COST + RETAINED_ITEM_COST * (len(self.items) + len(self.connectors))
+
+    def release(self):
+        super().release()
+        self.items = ()
+        self.connectors = ()
+
+
+class MoveItemsCommand(SceneCommand):
+    """Moves items by a shared delta; consecutive moves of one drag merge."""
+
+    journal_change = 'move'
+
+    def __init__(self, scene, items, dx, dy, drag_id, applied=False):
+        super().__init__(scene, "Move", applied)
+        self.items = tuple(items)
+        self.dx = dx
+        self.dy = dy
+        self.drag_id = drag_id
+
+    def id(self):
+        return MOVE_COMMAND_ID
+
+    def mergeWith(self, other):
+        if self.released or other.drag_id != self.drag_id or other.items != self.items:
+            return False
+        self.dx += other.dx
+        self.dy += other.dy
+        return True
+
+    def apply(self):
+        self.scene.moveItemsBy(self.items, self.dx, self.dy)
+
+    def revert(self):
+        self.scene.moveItemsBy(self.items, -self.dx, -self.dy)
+
+    def touchedItems(self):
+        return self.items
+
+    def cost(self):
+        return COMMAND_COST + ITEM_REFERENCE_COST * len(self.items)
+
+    def release(self):
+        super().release()
+        self.items = ()
+
+
+class ResizeItemCommand(SceneCommand):
+    """Changes an item's rect or line; consecutive resizes of one drag merge."""
+
+    journal_change = 'resize'
+
+    def __init__(self, scene, item, old_geometry, new_geometry, drag_id, applied=False):
+        super().__init__(scene, "Resize", applied)
+        self.item = item
+        self.old_geometry = old_geometry
+        self.new_geometry = new_geometry
+        self.drag_id = drag_id
+
+    def id(self):
+        return RESIZE_COMMAND_ID
+
+    def mergeWith(self, other):
+        if self.released or other.drag_id != self.drag_id or other.item is not self.item:
+            return False
+        self.new_geometry = other.new_geometry
+        return True
+
+    def apply(self):
+        setItemGeometry(self.item, self.new_geometry)
+        self.scene.markConnectorsDirty(self.item)
+
+    def revert(self):
+        setItemGeometry(self.item, self.old_geometry)
+        self.scene.markConnectorsDirty(self.item)
+
+    def touchedItems(self):
+        return (self.item,)
+
+    def release(self):
+        super().release()
+        self.item = None
+
+
+class RecolorItemsCommand(SceneCommand):
+    journal_change = 'recolor'
+
+    def __init__(self, scene, items, rgba):
+        super().__init__(scene, "Change Color")
+        self.items = tuple(items)
+        self.old_colors = tuple(itemColor(item) for item in self.items)
+        self.rgba = rgba
+
+    def apply(self):
+        for item in self.items:
+            setItemColor(item, self.rgba)
+
+    def revert(self):
+        for item, rgba in zip(self.items, self.old_colors):
+            setItemColor(item, rgba)
+
+    def touchedItems(self):
+        return self.items
+
+    def cost(self):
+        return COMMAND_COST + 2 * ITEM_REFERENCE_COST * len(self.items)
+
+    def release(self):
+        super().release()
+        self.items = ()
+        self.old_colors = ()
+
+
+class ConnectCommand(SceneCommand):
+    journal_change = 'presence'
+
+    def __init__(self, scene, connector):
+        super().__init__(scene, "Connect")
+        self.connector = connector
+
+    def apply(self):
+        self.scene.addConnectorItem(self.connector)
+
+    def revert(self):
+        self.scene.removeConnector(self.connector)
+
+    def touchedItems(self):
+        return (self.connector,)
+
+    def release(self):
+        super().release()
+        self.connector = None
+
+
+class RepositionItemsCommand(SceneCommand):
+    """Moves each item to its own position, e.g. after an automatic layout."""
+
+    journal_change = 'move'
+
+    def __init__(self, scene, items, old_positions, new_positions, text="Auto Layout", applied=False):
+        super().__init__(scene, text, applied)
+        self.items = tuple(items)
+        self.old_positions = tuple(old_positions)
+        self.new_positions = tuple(new_positions)
+
+    def apply(self):
+        self.scene.setItemPositions(self.items, self.new_positions)
+
+    def revert(self):
+        self.scene.setItemPositions(self.items, self.old_positions)
+
+    def touchedItems(self):
+        return self.items
+
+    def cost(self):
+        return COMMAND_COST + 5 * ITEM_REFERENCE_COST * len(self.items)
+
+    def release(self):
+        super().release()
+        self.items = ()
+        self.old_positions = ()
+        self.new_positions = ()
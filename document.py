@@ -0,0 +1,324 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+FORMAT_MAGIC = b'FLOWDOC\0'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sHHIIIII')
+
+SHAPE_KINDS = ('rect', 'ellipse', 'diamond')
+
+# Struct-of-arrays storage. Every column of a table has one entry per row,
+# except text_offsets, which has one more so text i is
+# text_data[text_offsets[i]:text_offsets[i + 1]].
+COLUMNS = (
+    ('shape_id', 'I', 'shapes'),
+    ('shape_kind', 'B', 'shapes'),
+    ('shape_x', 'd', 'shapes'),
+    ('shape_y', 'd', 'shapes'),
+    ('shape_w', 'd', 'shapes'),
+    ('shape_h', 'd', 'shapes'),
+    ('shape_stroke', 'I', 'shapes'),
+    ('shape_fill', 'I', 'shapes'),
+    ('connector_id', 'I', 'connectors'),
+    ('connector_src', 'I', 'connectors'),
+    ('connector_dst', 'I', 'connectors'),
+    ('connector_stroke', 'I', 'connectors'),
+    ('line_id', 'I', 'lines'),
+    ('line_x1', 'd', 'lines'),
+    ('line_y1', 'd', 'lines'),
+    ('line_x2', 'd', 'lines'),
+    ('line_y2', 'd', 'lines'),
+    ('line_stroke', 'I', 'lines'),
+    ('line_arrow', 'B', 'lines'),
+    ('text_id', 'I', 'texts'),
+    ('text_x', 'd', 'texts'),
+    ('text_y', 'd', 'texts'),
+    ('text_color', 'I', 'texts'),
+    ('text_offsets', 'I', 'text_offsets'),
+    ('text_data', 'B', 'text_data'),
+)
+
+
+class DocumentFormatError(ValueError):
+    pass
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+class Document:
+    """Shapes, connectors, free lines and text of a diagram in column arrays.
+
+    Colors are 32-bit 0xAARRGGBB values. Connector endpoints are row indices
+    into the shape columns. A document opened with load() maps the file and
+    reads columns straight from it; the first edit copies them into arrays.
+    """
+
+    def __init__(self):
+        self.columns = {name: array(typecode) for name, typecode, table in COLUMNS}
+        self.columns['text_offsets'].append(0)
+        self.next_id = 1
+        self._mmap = None
+
+    def __len__(self):
+        return len(self.columns['shape_id'])
+
+    @property
+    def connector_count(self):
+        return len(self.columns['connector_id'])
+
+    @property
+    def line_count(self):
+        return len(self.columns['line_id'])
+
+    @property
+    def text_count(self):
+        return len(self.columns['text_id'])
+
+    def text(self, index):
+        offsets = self.columns['text_offsets']
+        return bytes(self.columns['text_data'][offsets[index]:offsets[index + 1]]).decode('utf-8')
+
+    def _materialize(self):
+        if self._mmap is None:
+            return
+        columns = {}
+        for name, typecode, table in COLUMNS:
+            columns[name] = array(typecode)
+            columns[name].frombytes(self.columns[name].cast('B'))
+            if sys.byteorder != 'little':
+                columns[name].byteswap()
+        self.columns = columns
+        self._mmap.close()
+        self._mmap = None
+
+    def _new_id(self, item_id):
+        if self.next_id is None:
+            ids = [max(self.columns[name], default=0) for name in ('shape_id', 'connector_id', 'line_id', 'text_id')]
+            self.next_id = max(ids) + 1
+        if item_id is None:
+            item_id = self.next_id
+        self.next_id = max(self.next_id, item_id + 1)
+        return item_id
+
+    def add_shape(self, kind, x, y, w, h, stroke=0xff000000, fill=0, shape_id=None):
+        self._materialize()
+        columns = self.columns
+        columns['shape_id'].append(self._new_id(shape_id))
+        columns['shape_kind'].append(SHAPE_KINDS.index(kind))
+        columns['shape_x'].append(x)
+        columns['shape_y'].append(y)
+        columns['shape_w'].append(w)
+        columns['shape_h'].append(h)
+        columns['shape_stroke'].append(stroke)
+        columns['shape_fill'].append(fill)
+        return len(self) - 1
+
+    def add_connector(self, src, dst, stroke=0xff000000, connector_id=None):
+        self._materialize()
+        columns = self.columns
+        columns['connector_id'].append(self._new_id(connector_id))
+        columns['connector_src'].append(src)
+        columns['connector_dst'].append(dst)
+        columns['connector_stroke'].append(stroke)
+        return self.connector_count - 1
+
+    def add_line(self, x1, y1, x2, y2, stroke=0xff000000, arrow=False, line_id=None):
+        self._materialize()
+        columns = self.columns
+        columns['line_id'].append(self._new_id(line_id))
+        columns['line_x1'].append(x1)
+        columns['line_y1'].append(y1)
+        columns['line_x2'].append(x2)
+        columns['line_y2'].append(y2)
+        columns['line_stroke'].append(stroke)
+        columns['line_arrow'].append(1 if arrow else 0)
+        return self.line_count - 1
+
+    def add_text(self, x, y, text, color=0xff000000, text_id=None):
+        self._materialize()
+        columns = self.columns
+        columns['text_id'].append(self._new_id(text_id))
+        columns['text_x'].append(x)
+        columns['text_y'].append(y)
+        columns['text_color'].append(color)
+        columns['text_data'].frombytes(text.encode('utf-8'))
+        columns['text_offsets'].append(len(columns['text_data']))
+        return self.text_count - 1
+
+    def save(self, file_path):
+        columns = self.columns
+        counts = (len(self), self.connector_count, self.line_count, self.text_count, len(columns['text_data']))
+        with open(file_path, 'wb') as f:
+            f.write(HEADER.pack(FORMAT_MAGIC, FORMAT_VERSION, 0, *counts))
+            offset = HEADER.size
+            for name, typecode, table in COLUMNS:
+                padding = _align(offset) - offset
+                f.write(b'\0' * padding)
+                column = columns[name]
+                if not isinstance(column, array) or sys.byteorder != 'little':
+                    column = array(typecode, column)
+                    if sys.byteorder != 'little':
+                        column.byteswap()
+                f.write(column.tobytes())
+                offset += padding + len(column) * column.itemsize
+
+    @classmethod
+    def load(cls, file_path):
+        """Open a saved document, mapping its columns lazily from the file."""
+        with open(file_path, 'rb') as f:
+            # An empty file cannot be mapped at all, so check the size first.
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise DocumentFormatError(f"{file_path} is not a flowchart document")
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, flags, shapes, connectors, lines, texts, text_bytes = HEADER.unpack_from(mapped)
+        if magic != FORMAT_MAGIC:
+            mapped.close()
+            raise DocumentFormatError(f"{file_path} is not a flowchart document")
+        if version > FORMAT_VERSION:
+            mapped.close()
+            raise DocumentFormatError(f"{file_path} uses format version {version}, newer than {FORMAT_VERSION}")
+
+        rows = {'shapes': shapes, 'connectors': connectors, 'lines': lines, 'texts': texts,
+                'text_offsets': texts + 1, 'text_data': text_bytes}
+        view = memoryview(mapped)
+        document = cls.__new__(cls)
+        document.columns = {}
+        document.next_id = None
+        document._mmap = mapped
+        offset = HEADER.size
+        for name, typecode, table in COLUMNS:
+            offset = _align(offset)
+            size = rows[table] * array(typecode).itemsize
+            if offset + size > len(mapped):
+                document.columns.clear()
+                view.release()
+                mapped.close()
+                raise DocumentFormatError(f"{file_path} is truncated")
+            document.columns[name] = view[offset:offset + size].cast(typecode)
+            offset += size
+        view.release()
+        if sys.byteorder != 'little':
+            document._materialize()
+        problem = document._check_references()
+        if problem:
+            document.columns.clear()
+            if document._mmap is not None:
+                document._mmap.close()
+            raise DocumentFormatError(f"{file_path} is damaged: {problem}")
+        return document
+
+    def _check_references(self):
+        """Describe the first out-of-range kind, connector end or text offset, if any."""
+        columns = self.columns
+        if max(columns['shape_kind'], default=0) >= len(SHAPE_KINDS):
+            return "unknown shape kind"
+        shape_count = len(self)
+        if (max(columns['connector_src'], default=0) >= shape_count
+                or max(columns['connector_dst'], default=0) >= shape_count):
+            return "connector to a missing shape"
+        offsets = columns['text_offsets']
+        if (offsets[0] != 0 or offsets[-1] > len(columns['text_data'])
+                or any(a > b for a, b in zip(offsets, offsets[1:]))):
+            return "bad text offsets"
+        return None
+
+    def close(self):
+        """Release the file mapping of a document opened with load()."""
+        if self._mmap is not None:
+            self._materialize()
+
+    def to_json(self):
+        columns = self.columns
+        shape_ids = columns['shape_id']
+        return {
+            'format': 'flowchart',
+            'version': FORMAT_VERSION,
+            'shapes': [{'id': shape_ids[i], 'kind': SHAPE_KINDS[columns['shape_kind'][i]],
+                        'x': columns['shape_x'][i], 'y': columns['shape_y'][i],
+                        'width': columns['shape_w'][i], 'height': columns['shape_h'][i],
+                        'stroke': columns['shape_stroke'][i], 'fill': columns['shape_fill'][i]}
+                       for i in range(len(self))],
+            'connectors': [{'id': columns['connector_id'][i],
+                            'from': shape_ids[columns['connector_src'][i]],
+                            'to': shape_ids[columns['connector_dst'][i]],
+                            'stroke': columns['connector_stroke'][i]}
+                           for i in range(self.connector_count)],
+            'lines': [{'id': columns['line_id'][i],
+                       'x1': columns['line_x1'][i], 'y1': columns['line_y1'][i],
+                       'x2': columns['line_x2'][i], 'y2': columns['line_y2'][i],
+                       'stroke': columns['line_stroke'][i], 'arrow': bool(columns['line_arrow'][i])}
+                      for i in range(self.line_count)],
+            'texts': [{'id': columns['text_id'][i], 'x': columns['text_x'][i], 'y': columns['text_y'][i],
+                       'text': self.text(i), 'color': columns['text_color'][i]}
+                      for i in range(self.text_count)],
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        if not isinstance(data, dict) or data.get('format') != 'flowchart':
+            raise DocumentFormatError("not a flowchart JSON document")
+        document = cls()
+        index_by_id = {}
+        try:
+            for shape in data.get('shapes', []):
+                if shape['kind'] not in SHAPE_KINDS:
+                    raise DocumentFormatError(f"shape {shape['id']} has unknown kind {shape['kind']!r}")
+                index_by_id[shape['id']] = document.add_shape(shape['kind'], shape['x'], shape['y'],
+                                                              shape['width'], shape['height'],
+                                                              shape.get('stroke', 0xff000000), shape.get('fill', 0),
+                                                              shape_id=shape['id'])
+            for connector in data.get('connectors', []):
+                for end in ('from', 'to'):
+                    if connector[end] not in index_by_id:
+                        raise DocumentFormatError(
+                            f"connector {connector.get('id')} refers to missing shape {connector[end]}")
+                document.add_connector(index_by_id[connector['from']], index_by_id[connector['to']],
+                                       connector.get('stroke', 0xff000000), connector_id=connector.get('id'))
+            for line in data.get('lines', []):
+                document.add_line(line['x1'], line['y1'], line['x2'], line['y2'], line.get('stroke', 0xff000000),
+                                  line.get('arrow', False), line_id=line.get('id'))
+            for text in data.get('texts', []):
+                document.add_text(text['x'], text['y'], text['text'], text.get('color', 0xff000000),
+                                  text_id=text.get('id'))
+        except KeyError as error:
+            raise DocumentFormatError(f"an entry is missing the {error} key") from None
+        except (TypeError, OverflowError) as error:
+            # Wrong value types, e.g. a string coordinate or a negative id.
+            raise DocumentFormatError(f"bad value: {error}") from None
+        return document
+
+    def save_json(self, file_path):
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_json(), f, indent=2)
+
+    @classmethod
+    def load_json(cls, file_path):
+        with open(file_path, encoding='utf-8') as f:
+            try:
+                data = json.load(f)
+            except ValueError as error:  # includes bad UTF-8
+                raise DocumentFormatError(f"{file_path} is not valid JSON: {error}") from None
+        try:
+            return cls.from_json(data)
+        except DocumentFormatError as error:
+            raise DocumentFormatError(f"{file_path}: {error}") from None
+
+
+def load_any(file_path):
+    """Open a document from either the binary format or JSON."""
+    if file_path.lower().endswith('.json'):
+        return Document.load_json(file_path)
+    return Document.load(file_path)
+
+
+def save_any(document, file_path):
+    if file_path.lower().endswith('.json'):
+        document.save_json(file_path)
+    else:
+        document.save(file_path)
@@ -0,0 +1,251 @@
+"""Opt-in timing of the Qt editor's hot paths and startup.
+
+Run `python main_qt.py --profile[=trace.json]`, or set FLOWCHART_PROFILE to a
+trace file name (or to 1 for the default name). Instrumented methods are
+only wrapped when profiling is on, so a normal run pays nothing for it.
+
+`--startup-time[=report.json]` (or FLOWCHART_STARTUP_TIME) reports the time
+to the first paint of the diagram view and quits.
+"""
+import functools
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+from PyQt5.QtCore import Qt, QEvent, QObject, QTimer
+from PyQt5.QtWidgets import QApplication, QDockWidget, QHeaderView, QTableWidget, QTableWidgetItem
+
+DEFAULT_TRACE_FILE = 'flowchart_trace.json'
+PROFILE_ENV = 'FLOWCHART_PROFILE'
+STARTUP_ENV = 'FLOWCHART_STARTUP_TIME'
+STARTUP_TO_STDERR = '-'
+MAX_TRACE_EVENTS = 1000000  # later events are counted but not kept
+BUCKETS_PER_OCTAVE = 8  # histogram resolution, about 9% per bucket
+HUD_REFRESH_MS = 500
+
+EVENT_NAMES = {value: name for name, value in vars(QEvent).items() if isinstance(value, QEvent.Type)}
+
+
+def _optionTarget(argv, environ, flag, variable, default):
+    # Shared parsing of --flag[=path] and its environment variable; the flag
+    # is removed from argv so Qt does not see it.
+    for i, arg in enumerate(argv):
+        if arg == flag or arg.startswith(flag + '='):
+            del argv[i]
+            return arg.partition('=')[2] or default
+    value = environ.get(variable, '')
+    if value in ('', '0'):
+        return None
+    return default if value == '1' else value
+
+
+def profileTarget(argv, environ=os.environ):
+    """Return the trace file to write, or None if profiling is off.
+
+    A --profile flag is removed from argv.
+    """
+    return _optionTarget(argv, environ, '--profile', PROFILE_ENV, DEFAULT_TRACE_FILE)
+
+
+def startupTimingTarget(argv, environ=os.environ):
+    """Return where to report startup time, or None if not requested.
+
+    STARTUP_TO_STDERR means print it; anything else is a JSON file path.
+    A --startup-time flag is removed from argv.
+    """
+    return _optionTarget(argv, environ, '--startup-time', STARTUP_ENV, STARTUP_TO_STDERR)
+
+
+class LatencyHistogram:
+    """Counts durations in logarithmic buckets of nanoseconds."""
+
+    __slots__ = ('buckets', 'count', 'total', 'maximum')
+
+    def __init__(self):
+        self.buckets = [0] * (64 * BUCKETS_PER_OCTAVE)
+        self.count = 0
+        self.total = 0
+        self.maximum = 0
+
+    def add(self, duration):
+        self.buckets[int(math.log2(duration + 1) * BUCKETS_PER_OCTAVE)] += 1
+        self.count += 1
+        self.total += duration
+        if duration > self.maximum:
+            self.maximum = duration
+
+    def percentile(self, fraction):
+        """Approximate duration below which `fraction` of the samples fall."""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                # Geometric middle of the bucket, capped by the true maximum.
+                return min(2 ** ((bucket + 0.5) / BUCKETS_PER_OCTAVE) - 1, self.maximum)
+        return float(self.maximum)
+
+
+class Profiler:
+    """Histograms per hook plus a Chrome trace of every timed call."""
+
+    def __init__(self, max_events=MAX_TRACE_EVENTS):
+        self.histograms = {}
+        self.events = []
+        self.max_events = max_events
+        self.dropped_events = 0
+        self.origin = time.perf_counter_ns()
+
+    def record(self, name, start, end):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        histogram.add(end - start)
+        if len(self.events) < self.max_events:
+            self.events.append((name, start, end, threading.get_ident()))
+        else:
+            self.dropped_events += 1
+
+    def wrap(self, function, name):
+        record = self.record
+        clock = time.perf_counter_ns
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, start, clock())
+        return timed
+
+    def wrapEvent(self, function, prefix):
+        # Like wrap, but keyed by the QEvent type of the first argument.
+        record = self.record
+        clock = time.perf_counter_ns
+
+        @functools.wraps(function)
+        def timed(target, event, *args):
+            start = clock()
+            try:
+                return function(target, event, *args)
+            finally:
+                kind = event.type()
+                record(f"{prefix} {EVENT_NAMES.get(kind, int(kind))}", start, clock())
+        return timed
+
+    def instrument(self, cls, method, name=None):
+        """Replace cls.method with a timed version.
+
+        Call before any instance exists: sip caches per object whether a
+        C++ virtual has a Python override.
+        """
+        setattr(cls, method, self.wrap(getattr(cls, method), name or f"{cls.__name__}.{method}"))
+
+    def instrumentEvents(self, cls, method, prefix):
+        setattr(cls, method, self.wrapEvent(getattr(cls, method), prefix))
+
+    def summary(self):
+        """Rows of (name, count, p50 ms, p99 ms, max ms), slowest p99 first."""
+        rows = [(name, histogram.count, histogram.percentile(0.5) / 1e6, histogram.percentile(0.99) / 1e6,
+                 histogram.maximum / 1e6)
+                for name, histogram in self.histograms.items()]
+        rows.sort(key=lambda row: row[3], reverse=True)
+        return rows
+
+    def writeChromeTrace(self, file_path):
+        """Write the recorded calls as complete ("X") events for chrome://tracing or Perfetto."""
+        pid = os.getpid()
+        trace = {
+            'traceEvents': [{'name': name, 'ph': 'X', 'pid': pid, 'tid': tid,
+                             'ts': (start - self.origin) / 1000, 'dur': (end - start) / 1000}
+                            for name, start, end, tid in self.events],
+            'displayTimeUnit': 'ms',
+            'otherData': {'dropped_events': self.dropped_events},
+        }
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(trace, f)
+
+    def printSummary(self, file=sys.stderr):
+        print(f"{'hook':<40} {'count':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}", file=file)
+        for name, count, p50, p99, maximum in self.summary():
+            print(f"{name:<40} {count:>8} {p50:>8.3f} {p99:>8.3f} {maximum:>8.3f}", file=file)
+
+
+class PerformanceHud(QDockWidget):
+    """Dock showing live latency percentiles of every instrumented hook."""
+
+    COLUMNS = ("Hook", "Count", "p50 ms", "p99 ms", "Max ms")
+
+    def __init__(self, profiler, parent=None):
+        super().__init__("Performance", parent)
+        self.profiler = profiler
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.setWidget(self.table)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(HUD_REFRESH_MS)
+
+    def refresh(self):
+        if not self.isVisible():
+            return
+        rows = self.profiler.summary()
+        self.table.setRowCount(len(rows))
+        for row, (name, count, p50, p99, maximum) in enumerate(rows):
+            for column, text in enumerate((name, str(count), f"{p50:.3f}", f"{p99:.3f}", f"{maximum:.3f}")):
+                cell = self.table.item(row, column)
+                if cell is None:
+                    cell = QTableWidgetItem()
+                    if column:
+                        cell.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                    self.table.setItem(row, column, cell)
+                cell.setText(text)
+
+
+class FirstPaintTimer(QObject):
+    """Reports how long it took until `widget` first painted, then quits.
+
+    `start` is a time.perf_counter() value taken as early as possible. The
+    JSON report also holds the wall-clock time of the first paint, so a
+    launcher can include interpreter and bundle start-up in its figure.
+    """
+
+    def __init__(self, widget, start, target=STARTUP_TO_STDERR):
+        super().__init__(widget)
+        self.start = start
+        self.target = target
+        self.marks = []
+        widget.installEventFilter(self)
+
+    def mark(self, name, when=None):
+        """Note an intermediate step, at `when` or now."""
+        self.marks.append((name, time.perf_counter() if when is None else when))
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Paint:
+            watched.removeEventFilter(self)
+            # The filter runs before the paint; report once it is done.
+            QTimer.singleShot(0, self.report)
+        return False
+
+    def report(self):
+        now = time.perf_counter()
+        first_paint_ms = (now - self.start) * 1000
+        steps = {name: (mark - self.start) * 1000 for name, mark in self.marks}
+        if self.target == STARTUP_TO_STDERR:
+            details = ", ".join(f"{name} {ms:.0f} ms" for name, ms in steps.items())
+            print(f"first paint after {first_paint_ms:.0f} ms ({details})", file=sys.stderr)
+        else:
+            with open(self.target, 'w', encoding='utf-8') as f:
+                json.dump({'first_paint_ms': first_paint_ms, 'first_paint_time': time.time(), 'steps_ms': steps}, f)
+        QApplication.instance().quit()
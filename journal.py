@@ -0,0 +1,262 @@
+"""Append-only journal of diagram edits, for crash recovery.
+
+An autosave directory holds numbered generations: snapshot-<n>.flow is a
+Document with the whole diagram and journal-<n>.bin the edits made after
+it. Edits are encoded on the caller's thread into a memory buffer; a
+background thread writes and fsyncs the buffer in batches, and writes
+snapshots. A new generation starts with each snapshot, and older files are
+removed once the snapshot is safely on disk, so recovery is "load the
+newest snapshot, then replay every journal from its generation on".
+
+Records describe the state an edit left behind (an item's position, its
+geometry, its colour) rather than the change, so replaying one twice is
+harmless. Nothing here depends on Qt.
+"""
+import os
+import struct
+import sys
+import threading
+import zlib
+
+from document import Document
+
+JOURNAL_MAGIC = b'FCJ1'
+FLUSH_INTERVAL = 1.0  # seconds between batched fsyncs while edits come in
+FLUSH_BYTES = 256 * 1024  # write early once this much is buffered
+MIN_COMPACT_BYTES = 1024 * 1024  # journal size before a snapshot is worth it
+
+OP_ADD_SHAPE = 1  # kind, x, y, w, h (scene rect), stroke, fill
+OP_ADD_LINE = 2  # x1, y1, x2, y2 (scene), stroke
+OP_ADD_TEXT = 3  # x, y, color, then the UTF-8 text
+OP_CONNECT = 4  # source id, target id, stroke
+OP_MOVE = 5  # x, y of the item's geometry origin in the scene
+OP_RESIZE = 6  # scene rect (x, y, w, h) or line (x1, y1, x2, y2)
+OP_RECOLOR = 7  # rgba
+OP_DELETE = 8
+OP_CLEAR = 9  # item id unused
+
+RECORD_FORMATS = {
+    OP_ADD_SHAPE: struct.Struct('<BIBddddII'),
+    OP_ADD_LINE: struct.Struct('<BIddddI'),
+    OP_ADD_TEXT: struct.Struct('<BIddI'),
+    OP_CONNECT: struct.Struct('<BIIII'),
+    OP_MOVE: struct.Struct('<BIdd'),
+    OP_RESIZE: struct.Struct('<BIdddd'),
+    OP_RECOLOR: struct.Struct('<BII'),
+    OP_DELETE: struct.Struct('<BI'),
+    OP_CLEAR: struct.Struct('<BI'),
+}
+RECORD_HEADER = struct.Struct('<II')  # payload length, CRC-32 of the payload
+
+
+def encode_record(op, item_id, *fields):
+    """One framed record; OP_ADD_TEXT takes the text as its last field."""
+    if op == OP_ADD_TEXT:
+        *fields, text = fields
+        payload = RECORD_FORMATS[op].pack(op, item_id, *fields) + text.encode('utf-8')
+    else:
+        payload = RECORD_FORMATS[op].pack(op, item_id, *fields)
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_records(file_path):
+    """Decode a journal file into (op, item_id, *fields) tuples.
+
+    Reading stops at the first torn or corrupt record, which is where the
+    writing process died.
+    """
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    if data[:len(JOURNAL_MAGIC)] != JOURNAL_MAGIC:
+        return []
+    records = []
+    offset = len(JOURNAL_MAGIC)
+    while offset + RECORD_HEADER.size <= len(data):
+        length, checksum = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            break
+        record_format = RECORD_FORMATS.get(payload[0]) if payload else None
+        if record_format is None or length < record_format.size:
+            break
+        fields = record_format.unpack_from(payload)
+        if fields[0] == OP_ADD_TEXT:
+            fields += (payload[record_format.size:].decode('utf-8', 'replace'),)
+        records.append(fields)
+        offset = start + length
+    return records
+
+
+def _path(directory, kind, generation):
+    return os.path.join(directory, f'{kind}-{generation}.' + ('flow' if kind == 'snapshot' else 'bin'))
+
+
+def _generations(directory, kind):
+    generations = []
+    for name in os.listdir(directory):
+        stem, _, extension = name.partition('.')
+        prefix, _, number = stem.partition('-')
+        if prefix == kind and number.isdigit() and extension == ('flow' if kind == 'snapshot' else 'bin'):
+            generations.append(int(number))
+    return sorted(generations)
+
+
+def recover(directory):
+    """Return (generation, document, records) left by an unfinished session.
+
+    document is the newest snapshot, or None if the session never wrote
+    one, and records are the edits made after it. Returns None if there is
+    nothing to recover.
+    """
+    if not os.path.isdir(directory):
+        return None
+    snapshots = _generations(directory, 'snapshot')
+    journals = _generations(directory, 'journal')
+    if not snapshots and not journals:
+        return None
+    base = snapshots[-1] if snapshots else journals[0]
+    document = Document.load(_path(directory, 'snapshot', base)) if snapshots else None
+    records = []
+    for generation in journals:
+        if generation >= base:
+            records.extend(read_records(_path(directory, 'journal', generation)))
+    return max([base] + journals), document, records
+
+
+class Journal:
+    """Writes records and snapshots to an autosave directory in the background.
+
+    append() and snapshot() only touch memory and are cheap enough to call
+    from the GUI thread on every edit. Call close() before exiting; with
+    discard=True the autosave files are removed, as after a clean shutdown.
+    """
+
+    def __init__(self, directory, generation=0, flush_interval=FLUSH_INTERVAL, min_compact_bytes=MIN_COMPACT_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.generation = generation
+        self.flush_interval = flush_interval
+        self.min_compact_bytes = min_compact_bytes
+        self.journal_bytes = 0  # appended since the last snapshot request
+        self.snapshot_bytes = 0  # size of the last snapshot written
+        self.error = None
+
+        self.condition = threading.Condition()
+        self.buffer = bytearray()
+        self.pending = []  # (records before the snapshot, document, generation)
+        self.closing = False
+        self.discard = False
+        self.file = self._open_journal(generation)
+        self.thread = threading.Thread(target=self._run, name="journal writer", daemon=True)
+        self.thread.start()
+
+    def append(self, record):
+        with self.condition:
+            self.buffer += record
+            if len(self.buffer) >= FLUSH_BYTES:
+                self.condition.notify()
+        self.journal_bytes += len(record)
+
+    def needs_compaction(self):
+        """True once the journal has grown to the size of the last snapshot.
+
+        Snapshotting then costs no more than the edits since the last one
+        did to record, so the autosave cost per edit stays bounded.
+        """
+        return self.journal_bytes >= max(self.min_compact_bytes, self.snapshot_bytes)
+
+    def snapshot(self, document):
+        """Start a new generation from `document`, the diagram as of now.
+
+        The document is saved on the writer thread and must not change
+        afterwards.
+        """
+        with self.condition:
+            self.generation += 1
+            self.pending.append((bytes(self.buffer), document, self.generation))
+            self.buffer = bytearray()
+            self.condition.notify()
+        self.journal_bytes = 0
+
+    def close(self, discard=False):
+        with self.condition:
+            self.closing = True
+            self.discard = discard
+            self.condition.notify()
+        self.thread.join()
+
+    def _open_journal(self, generation):
+        file_path = _path(self.directory, 'journal', generation)
+        journal_file = open(file_path, 'ab')
+        if journal_file.tell() == 0:
+            journal_file.write(JOURNAL_MAGIC)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+            self._sync_directory()
+        return journal_file
+
+    def _sync_directory(self):
+        # Make renames and new files durable; not possible on Windows.
+        if not hasattr(os, 'O_DIRECTORY'):
+            return
+        descriptor = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+    def _write(self, data):
+        if data:
+            self.file.write(data)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def _rotate(self, document, generation):
+        self.file.close()
+        self.file = self._open_journal(generation)
+        snapshot_path = _path(self.directory, 'snapshot', generation)
+        temporary_path = snapshot_path + '.tmp'
+        document.save(temporary_path)
+        with open(temporary_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(temporary_path, snapshot_path)
+        self._sync_directory()
+        self.snapshot_bytes = os.path.getsize(snapshot_path)
+        # The new snapshot covers everything before it.
+        for kind in ('snapshot', 'journal'):
+            for old in _generations(self.directory, kind):
+                if old < generation:
+                    os.remove(_path(self.directory, kind, old))
+
+    def _remove_all(self):
+        for name in os.listdir(self.directory):
+            stem = name.partition('-')[0]
+            if stem in ('snapshot', 'journal'):
+                os.remove(os.path.join(self.directory, name))
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if not (self.closing or self.pending or len(self.buffer) >= FLUSH_BYTES):
+                    self.condition.wait(self.flush_interval)
+                pending, self.pending = self.pending, []
+                data, self.buffer = bytes(self.buffer), bytearray()
+                closing, discard = self.closing, self.discard
+            try:
+                for records, document, generation in pending:
+                    self._write(records)
+                    self._rotate(document, generation)
+                self._write(data)
+                if closing:
+                    self.file.close()
+                    if discard:
+                        self._remove_all()
+                    return
+            except OSError as error:
+                # Keep the editor running; the autosave is best effort.
+                if self.error is None:
+                    print(f"autosave failed: {error}", file=sys.stderr)
+                self.error = error
+                if closing:
+                    return
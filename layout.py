@@ -0,0 +1,282 @@
+"""Automatic placement of diagram nodes.
+
+Both layouts take the node count, an edge list of (source, target) index
+pairs and an (n, 2) array of node sizes, and return an (n, 2) array of node
+top-left positions. They know nothing about Qt so they can run on a worker
+thread.
+"""
+import numpy as np
+
+FAR_FIELD_BLOCK = 512  # cells per block when summing cell-to-cell forces
+NEAR_FIELD_SAMPLE = 64  # nodes per neighbouring cell a node is repelled by exactly
+
+
+def _break_cycles(node_count, edges):
+    # Iterative DFS; edges that point back into the DFS stack are reversed so
+    # the graph becomes acyclic.
+    adjacency = [[] for _ in range(node_count)]
+    for source, target in edges:
+        if source != target:
+            adjacency[source].append(target)
+    state = [0] * node_count  # 0 = unvisited, 1 = on stack, 2 = done
+    back_edges = set()
+    for root in range(node_count):
+        if state[root]:
+            continue
+        state[root] = 1
+        stack = [(root, iter(adjacency[root]))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if state[child] == 1:
+                    back_edges.add((node, child))
+                elif state[child] == 0:
+                    state[child] = 1
+                    stack.append((child, iter(adjacency[child])))
+                    break
+            else:
+                state[node] = 2
+                stack.pop()
+    return [(target, source) if (source, target) in back_edges else (source, target)
+            for source, target in edges if source != target]
+
+
+def _assign_layers(node_count, edges):
+    # Longest path from the sources, in topological order.
+    successors = [[] for _ in range(node_count)]
+    indegree = [0] * node_count
+    for source, target in edges:
+        successors[source].append(target)
+        indegree[target] += 1
+    layer = [0] * node_count
+    queue = [node for node in range(node_count) if indegree[node] == 0]
+    for node in queue:
+        for child in successors[node]:
+            layer[child] = max(layer[child], layer[node] + 1)
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                queue.append(child)
+    return layer
+
+
+def layered_layout(node_count, edges, sizes, layer_gap=80.0, node_gap=40.0, sweeps=4):
+    """Sugiyama-style layout: nodes in horizontal layers, edges pointing down."""
+    sizes = np.asarray(sizes, dtype=float).reshape(node_count, 2)
+    edges = _break_cycles(node_count, edges)
+    layer = _assign_layers(node_count, edges)
+
+    # Split edges spanning several layers with dummy nodes so that crossing
+    # reduction sees every edge segment.
+    widths = list(sizes[:, 0])
+    layer = list(layer)
+    up = [[] for _ in range(node_count)]
+    down = [[] for _ in range(node_count)]
+    for source, target in edges:
+        previous = source
+        for dummy_layer in range(layer[source] + 1, layer[target]):
+            dummy = len(layer)
+            layer.append(dummy_layer)
+            widths.append(0.0)
+            up.append([previous])
+            down.append([])
+            down[previous].append(dummy)
+            previous = dummy
+        down[previous].append(target)
+        up[target].append(previous)
+
+    layer_count = max(layer, default=-1) + 1
+    layers = [[] for _ in range(layer_count)]
+    for node, node_layer in enumerate(layer):
+        layers[node_layer].append(node)
+
+    # Barycenter crossing reduction, sweeping down and then up.
+    order = [0] * len(layer)
+    for nodes in layers:
+        for index, node in enumerate(nodes):
+            order[node] = index
+    for sweep in range(sweeps):
+        if sweep % 2 == 0:
+            layer_range, neighbours = range(1, layer_count), up
+        else:
+            layer_range, neighbours = range(layer_count - 2, -1, -1), down
+        for layer_index in layer_range:
+            nodes = layers[layer_index]
+            keys = {}
+            for node in nodes:
+                adjacent = neighbours[node]
+                keys[node] = sum(order[other] for other in adjacent) / len(adjacent) if adjacent else order[node]
+            nodes.sort(key=keys.__getitem__)
+            for index, node in enumerate(nodes):
+                order[node] = index
+
+    # Place each layer at the mean centre of its upper neighbours. Overlaps
+    # are resolved by packing the layer once from the left and once from the
+    # right and averaging, so no side is favoured and layers do not drift.
+    centre_x = [0.0] * len(layer)
+    heights = np.zeros(layer_count)
+    for node in range(node_count):
+        heights[layer[node]] = max(heights[layer[node]], sizes[node, 1])
+    dummy_gap = node_gap / 4
+    for nodes in layers:
+        if not nodes:
+            continue
+        desired = []
+        for node in nodes:
+            adjacent = up[node]
+            desired.append(sum(centre_x[other] for other in adjacent) / len(adjacent) if adjacent else None)
+        known = [value for value in desired if value is not None]
+        fallback = sum(known) / len(known) if known else 0.0
+        desired = [fallback if value is None else value for value in desired]
+        separation = [(widths[left] + widths[right]) / 2
+                      + (node_gap if left < node_count and right < node_count else dummy_gap)
+                      for left, right in zip(nodes, nodes[1:])]
+        from_left = desired[:]
+        for index in range(1, len(nodes)):
+            from_left[index] = max(from_left[index], from_left[index - 1] + separation[index - 1])
+        from_right = desired[:]
+        for index in range(len(nodes) - 2, -1, -1):
+            from_right[index] = min(from_right[index], from_right[index + 1] - separation[index])
+        for node, left, right in zip(nodes, from_left, from_right):
+            centre_x[node] = (left + right) / 2
+
+    layer_top = np.concatenate(([0.0], np.cumsum(heights + layer_gap)[:-1]))
+    positions = np.empty((node_count, 2))
+    positions[:, 0] = np.asarray(centre_x[:node_count]) - sizes[:, 0] / 2
+    positions[:, 0] -= positions[:, 0].min() if node_count else 0.0
+    positions[:, 1] = layer_top[np.asarray(layer[:node_count], dtype=int)] if node_count else 0.0
+    return positions
+
+
+def _repulsion(centres, k2, cells_per_side):
+    """Approximate sum of k^2 / d repulsion over all node pairs.
+
+    Nodes are binned into a uniform grid. Nodes in the same or adjacent cells
+    repel each other exactly; more distant cells act through their centre of
+    mass, as in Barnes-Hut with one level of aggregation. A node only pairs
+    with NEAR_FIELD_SAMPLE nodes of a crowded neighbouring cell, weighted up
+    to stand for the whole cell, so the pair count stays linear in n.
+    """
+    n = len(centres)
+    low = centres.min(axis=0)
+    extent = max(float((centres.max(axis=0) - low).max()), 1e-9)
+    cell_size = extent / cells_per_side * (1 + 1e-9)
+    cell_xy = np.minimum(((centres - low) / cell_size).astype(np.int64), cells_per_side - 1)
+    cell = cell_xy[:, 1] * cells_per_side + cell_xy[:, 0]
+    cell_count = cells_per_side * cells_per_side
+
+    order = np.argsort(cell, kind='stable')
+    counts = np.bincount(cell, minlength=cell_count)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    sorted_cell = cell[order]
+    sorted_xy = cell_xy[order]
+
+    # Near field: every node against (a sample of) every node of its 3x3
+    # cell neighbourhood.
+    sources, targets, weights = [], [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            neighbour_xy = sorted_xy + (dx, dy)
+            valid = ((neighbour_xy >= 0) & (neighbour_xy < cells_per_side)).all(axis=1)
+            neighbour = np.where(valid, neighbour_xy[:, 1] * cells_per_side + neighbour_xy[:, 0], 0)
+            cell_counts = np.where(valid, counts[neighbour], 0)
+            pair_counts = np.minimum(cell_counts, NEAR_FIELD_SAMPLE)
+            total = int(pair_counts.sum())
+            if not total:
+                continue
+            repeated = np.repeat(np.arange(n), pair_counts)
+            first = np.cumsum(pair_counts) - pair_counts
+            offsets = np.arange(total) - np.repeat(first, pair_counts)
+            weight = None
+            if (cell_counts > NEAR_FIELD_SAMPLE).any():
+                # Spread the sample evenly over the cell, starting somewhere
+                # different for each node.
+                cell_sizes = np.repeat(cell_counts, pair_counts)
+                sampled = np.repeat(pair_counts, pair_counts)
+                offsets = (offsets * cell_sizes // sampled + repeated) % cell_sizes
+                weight = cell_sizes / sampled
+            sources.append(order[repeated])
+            targets.append(order[np.repeat(starts[neighbour], pair_counts) + offsets])
+            weights.append(weight)
+    sampled_any = any(weight is not None for weight in weights)
+    if sampled_any:
+        weights = np.concatenate([np.ones(len(source)) if weight is None else weight
+                                  for source, weight in zip(sources, weights)])
+    sources = np.concatenate(sources)
+    targets = np.concatenate(targets)
+    keep = sources != targets
+    sources, targets = sources[keep], targets[keep]
+    # Without sampling every weight is 1, so skip the extra array.
+    weights = weights[keep] if sampled_any else 1.0
+    x, y = centres[:, 0], centres[:, 1]
+    dx = x[sources] - x[targets]
+    dy = y[sources] - y[targets]
+    scale = weights * k2 / np.maximum(dx * dx + dy * dy, 1e-2)
+    force = np.column_stack((np.bincount(sources, dx * scale, minlength=n),
+                             np.bincount(sources, dy * scale, minlength=n)))
+
+    # Far field: cell centres of mass acting on whole cells.
+    occupied = np.flatnonzero(counts)
+    mass = counts[occupied].astype(float)
+    centroid_x = np.bincount(sorted_cell, x[order], minlength=cell_count)[occupied] / mass
+    centroid_y = np.bincount(sorted_cell, y[order], minlength=cell_count)[occupied] / mass
+    occupied_x = occupied % cells_per_side
+    occupied_y = occupied // cells_per_side
+    far_x = np.empty(len(occupied))
+    far_y = np.empty(len(occupied))
+    for block in range(0, len(occupied), FAR_FIELD_BLOCK):
+        rows = slice(block, block + FAR_FIELD_BLOCK)
+        dx = centroid_x[rows, None] - centroid_x[None, :]
+        dy = centroid_y[rows, None] - centroid_y[None, :]
+        weight = mass[None, :] * k2 / np.maximum(dx * dx + dy * dy, 1e-2)
+        adjacent = ((np.abs(occupied_x[rows, None] - occupied_x[None, :]) <= 1)
+                    & (np.abs(occupied_y[rows, None] - occupied_y[None, :]) <= 1))
+        weight[adjacent] = 0.0
+        far_x[rows] = (dx * weight).sum(axis=1)
+        far_y[rows] = (dy * weight).sum(axis=1)
+    far = np.zeros((cell_count, 2))
+    far[occupied, 0] = far_x
+    far[occupied, 1] = far_y
+    return force + far[cell]
+
+
+def force_layout(node_count, edges, sizes, initial=None, iterations=None, seed=0):
+    """Fruchterman-Reingold layout with grid-approximated repulsion."""
+    sizes = np.asarray(sizes, dtype=float).reshape(node_count, 2)
+    if node_count == 0:
+        return np.zeros((0, 2))
+    k = float(np.mean(sizes.max(axis=1))) * 1.5 + 20.0
+    side = k * np.sqrt(node_count)
+    rng = np.random.default_rng(seed)
+    if initial is not None and np.ptp(np.asarray(initial, dtype=float), axis=0).max() > 0:
+        centres = np.asarray(initial, dtype=float) + sizes / 2
+        # Nodes on the same spot, e.g. shapes added from the template dock,
+        # push each other in no direction; scatter them first.
+        _, inverse, group_counts = np.unique(centres, axis=0, return_inverse=True, return_counts=True)
+        stacked_counts = group_counts[inverse.reshape(-1)]
+        stacked = stacked_counts > 1
+        if stacked.any():
+            spread = k * np.sqrt(stacked_counts[stacked])[:, None] / 2
+            centres[stacked] += rng.uniform(-1, 1, (int(stacked.sum()), 2)) * spread
+    else:
+        centres = rng.uniform(0, side, (node_count, 2))
+    if iterations is None:
+        iterations = 100 if node_count < 2000 else 50
+
+    edges = np.asarray([(s, t) for s, t in edges if s != t], dtype=np.int64).reshape(-1, 2)
+    # Aim for roughly five nodes per grid cell.
+    cells_per_side = max(1, int(np.sqrt(node_count / 5)))
+    start_temperature = side / 10
+    for iteration in range(iterations):
+        temperature = start_temperature * (1 - iteration / iterations)
+        force = _repulsion(centres, k * k, cells_per_side)
+        if len(edges):
+            delta = centres[edges[:, 0]] - centres[edges[:, 1]]
+            distance = np.sqrt((delta ** 2).sum(axis=1)) + 1e-9
+            pull = delta * (distance / k)[:, None]
+            for column in (0, 1):
+                force[:, column] -= np.bincount(edges[:, 0], pull[:, column], minlength=node_count)
+                force[:, column] += np.bincount(edges[:, 1], pull[:, column], minlength=node_count)
+        length = np.sqrt((force ** 2).sum(axis=1)) + 1e-9
+        centres += force / length[:, None] * np.minimum(length, temperature)[:, None]
+    positions = centres - sizes / 2
+    return positions - positions.min(axis=0)
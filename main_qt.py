@@ -1,7 +1,95 @@
+import math
+import os
 import sys
-from PyQt5.QtWidgets import QApplication, QMainWindow, QGraphicsScene, QGraphicsView, QGraphicsRectItem, QGraphicsEllipseItem, QGraphicsLineItem, QVBoxLayout, QPushButton, QWidget, QHBoxLayout, QColorDialog, QFileDialog, QGraphicsTextItem, QInputDialog, QGraphicsItem, QDockWidget, QListWidget, QListWidgetItem
-from PyQt5.QtCore import Qt, QPointF, QLineF, QRectF, QSize, QEvent
-from PyQt5.QtGui import QPen, QColor, QPainter, QImage, QTransform, QWheelEvent
+import time
+from collections import deque
+from contextlib import contextmanager
+
+STARTUP_CLOCK = time.perf_counter()  # taken before the Qt imports, see --startup-time
+
+from PyQt5.QtWidgets import QApplication, QMainWindow, QGraphicsScene, QGraphicsView, QGraphicsRectItem, QGraphicsEllipseItem, QGraphicsLineItem, QVBoxLayout, QPushButton, QWidget, QHBoxLayout, QGraphicsTextItem, QGraphicsItem, QDockWidget, QListWidget, QListWidgetItem, QGraphicsPolygonItem, QUndoStack, QStyle  # noqa: E402
+from PyQt5.QtCore import Qt, QPointF, QLineF, QRectF, QSize, QEvent, QEasingCurve, QLockFile, QThread, QTimer, QVariantAnimation, pyqtSignal  # noqa: E402
+from PyQt5.QtGui import QPen, QColor, QPainter, QTransform, QPixmap, QBrush, QPolygonF, QKeySequence, QPainterPath, QPainterPathStroker  # noqa: E402
+from PyQt5 import sip  # noqa: E402
+
+from commands import AddItemsCommand, ConnectCommand, DeleteItemsCommand, MoveItemsCommand, RecolorItemsCommand, RepositionItemsCommand, ResizeItemCommand, commandCost, itemColor, itemGeometry, releaseCommand, setItemColor  # noqa: E402
+from document import Document, DocumentFormatError, SHAPE_KINDS, load_any, save_any  # noqa: E402
+from instrumentation import FirstPaintTimer, Profiler, profileTarget, startupTimingTarget  # noqa: E402
+from journal import OP_ADD_LINE, OP_ADD_SHAPE, OP_ADD_TEXT, OP_CLEAR, OP_CONNECT, OP_DELETE, OP_MOVE, OP_RECOLOR, OP_RESIZE, Journal, encode_record, recover  # noqa: E402
+from routing import ConnectorRouter  # noqa: E402
+# Dialogs, layout (NumPy) and tiled_export are imported where first used
+# to keep startup fast.
+
+ITEM_ID = 0  # QGraphicsItem data key holding the item's document id
+DOCUMENT_FILE_FILTER = "Flowchart Files (*.flow);;JSON Files (*.json);;All Files (*)"
+UNDO_LIMIT = 1000
+UNDO_MEMORY_BUDGET = 32 * 1024 * 1024  # estimated bytes, see commands.commandCost
+LAYOUT_MODES = ["Layered", "Force-directed"]
+LAYOUT_ANIMATION_MS = 400
+LAYOUT_ANIMATION_LIMIT = 2000  # larger diagrams jump straight to the result
+GRID_TILE_LIMIT = 1024  # pixels; grids with larger cells are drawn line by line
+ROUTE_FRAME_BUDGET = 0.008  # seconds of connector routing per event or frame
+SHAPE_ITEM_TYPES = (QGraphicsRectItem, QGraphicsEllipseItem, QGraphicsPolygonItem)
+AUTOSAVE_COMPACT_MS = 10000  # how often to check whether the journal needs a snapshot
+
+
+def _values(values):
+    # Plain Python values for the bulk API: NumPy arrays, arrays and
+    # memoryviews convert in one call, iterators are materialized.
+    if hasattr(values, 'tolist'):
+        return values.tolist()
+    return values if hasattr(values, '__len__') else list(values)
+
+
+def sceneShape(item):
+    """Return the SHAPE_KINDS name of a shape item and its rect in the scene."""
+    if isinstance(item, QGraphicsRectItem):
+        return 'rect', item.mapRectToScene(item.rect())
+    if isinstance(item, QGraphicsEllipseItem):
+        return 'ellipse', item.mapRectToScene(item.rect())
+    return 'diamond', item.mapRectToScene(item.polygon().boundingRect())
+
+
+def journalAnchor(item):
+    """The scene point that journal move records give for an item."""
+    if isinstance(item, SHAPE_ITEM_TYPES):
+        return sceneShape(item)[1].topLeft()
+    if isinstance(item, QGraphicsLineItem):
+        return item.mapToScene(item.line().p1())
+    return item.scenePos()
+
+
+def obstacleRect(item):
+    rect = item.sceneBoundingRect()
+    return (rect.left(), rect.top(), rect.right(), rect.bottom())
+
+
+class LevelOfDetail:
+    """Thresholds, in levelOfDetailFromTransform units, for simplified painting.
+
+    A level of detail of 1.0 is 100% zoom. Below text_threshold text is drawn
+    as grey bars, below antialias_threshold connectors are drawn without
+    antialiasing, and shapes whose on-screen size is under min_item_pixels are
+    drawn as a single filled dot.
+    """
+
+    def __init__(self, text_threshold=0.4, antialias_threshold=0.5, min_item_pixels=1.0):
+        self.text_threshold = text_threshold
+        self.antialias_threshold = antialias_threshold
+        self.min_item_pixels = min_item_pixels
+
+
+def paintSubPixel(item, painter, option):
+    # Returns True if the item was too small to paint in full and got a dot instead.
+    scene = item.scene()
+    if scene is None:
+        return False
+    lod = option.levelOfDetailFromTransform(painter.worldTransform())
+    rect = item.polygon().boundingRect() if isinstance(item, QGraphicsPolygonItem) else item.rect()
+    if max(rect.width(), rect.height()) * lod >= scene.lod.min_item_pixels:
+        return False
+    painter.fillRect(rect, item.pen().color())
+    return True
 
 
 class ShapeItem(QGraphicsRectItem):
@@ -10,11 +98,56 @@ class ShapeItem(QGraphicsRectItem):
         self.setFlags(QGraphicsItem.ItemIsMovable | QGraphicsItem.ItemIsSelectable | QGraphicsItem.ItemSendsGeometryChanges)
 
     def itemChange(self, change, value):
-        if change == QGraphicsItem.ItemPositionChange:
-            for line in self.scene().lines:
-                line.updatePosition()
+        if change == QGraphicsItem.ItemPositionHasChanged and self.scene():
+            self.scene().markConnectorsDirty(self)
         return super().itemChange(change, value)
 
+    def paint(self, painter, option, widget=None):
+        if not paintSubPixel(self, painter, option):
+            super().paint(painter, option, widget)
+
+
+class EllipseItem(QGraphicsEllipseItem):
+    def itemChange(self, change, value):
+        if change == QGraphicsItem.ItemPositionHasChanged and self.scene():
+            self.scene().markConnectorsDirty(self)
+        return super().itemChange(change, value)
+
+    def paint(self, painter, option, widget=None):
+        if not paintSubPixel(self, painter, option):
+            super().paint(painter, option, widget)
+
+
+class DiamondItem(QGraphicsPolygonItem):
+    def itemChange(self, change, value):
+        if change == QGraphicsItem.ItemPositionHasChanged and self.scene():
+            self.scene().markConnectorsDirty(self)
+        return super().itemChange(change, value)
+
+    def paint(self, painter, option, widget=None):
+        if not paintSubPixel(self, painter, option):
+            super().paint(painter, option, widget)
+
+
+class TextItem(QGraphicsTextItem):
+    def paint(self, painter, option, widget=None):
+        scene = self.scene()
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        if scene is None or lod >= scene.lod.text_threshold:
+            super().paint(painter, option, widget)
+            return
+        # Too small to read: draw one bar per laid-out line instead of glyphs.
+        document = self.document()
+        document_layout = document.documentLayout()
+        block = document.begin()
+        while block.isValid():
+            offset = document_layout.blockBoundingRect(block).topLeft()
+            layout = block.layout()
+            for i in range(layout.lineCount()):
+                line_rect = layout.lineAt(i).naturalTextRect().translated(offset)
+                painter.fillRect(line_rect.adjusted(0, line_rect.height() * 0.25, 0, -line_rect.height() * 0.25), Qt.gray)
+            block = block.next()
+
 
 class ConnectorLine(QGraphicsLineItem):
     def __init__(self, start_item, end_item, *args):
@@ -23,15 +156,91 @@ class ConnectorLine(QGraphicsLineItem):
         self.end_item = end_item
         self.setPen(QPen(Qt.black, 2))
         self.setFlags(QGraphicsItem.ItemIsSelectable)
+        self.route = None  # orthogonal route in scene coordinates, or None for the straight line
+        self.route_polygon = None
 
     def updatePosition(self):
-        self.setLine(QLineF(self.start_item.scenePos() + self.start_item.rect().center(),
-                            self.end_item.scenePos() + self.end_item.rect().center()))
+        self.setLine(QLineF(self.start_item.scenePos() + self.start_item.boundingRect().center(),
+                            self.end_item.scenePos() + self.end_item.boundingRect().center()))
+
+    def setRoute(self, points):
+        if points == self.route:
+            return
+        self.prepareGeometryChange()
+        self.route = points
+        self.route_polygon = QPolygonF([QPointF(x, y) for x, y in points]) if points else None
+
+    def boundingRect(self):
+        if self.route_polygon is None:
+            return super().boundingRect()
+        half_width = self.pen().widthF() / 2
+        return self.route_polygon.boundingRect().adjusted(-half_width, -half_width, half_width, half_width)
+
+    def shape(self):
+        if self.route_polygon is None:
+            return super().shape()
+        path = QPainterPath()
+        path.addPolygon(self.route_polygon)
+        stroker = QPainterPathStroker()
+        stroker.setWidth(self.pen().widthF())
+        return stroker.createStroke(path)
+
+    def paint(self, painter, option, widget=None):
+        scene = self.scene()
+        if scene is not None and option.levelOfDetailFromTransform(painter.worldTransform()) < scene.lod.antialias_threshold:
+            painter.setRenderHint(QPainter.Antialiasing, False)
+        if self.route_polygon is None:
+            super().paint(painter, option, widget)
+            return
+        painter.setPen(self.pen())
+        painter.drawPolyline(self.route_polygon)
+        if option.state & QStyle.State_Selected:
+            painter.setPen(QPen(option.palette.windowText(), 0, Qt.DashLine))
+            painter.setBrush(Qt.NoBrush)
+            painter.drawRect(self.boundingRect())
+
+
+class LayoutWorker(QThread):
+    """Runs one of the layout.py layouts off the GUI thread.
+
+    done carries the top-left list, or None if the layout failed.
+    """
+
+    done = pyqtSignal(object)
+
+    def __init__(self, mode, node_count, edges, sizes, positions, parent=None):
+        super().__init__(parent)
+        self.mode = mode
+        self.node_count = node_count
+        self.edges = edges
+        self.sizes = sizes
+        self.positions = positions
+        self.error = None  # the exception that stopped the layout, if any
+
+    def run(self):
+        # done must always be emitted, or the layout button stays disabled.
+        try:
+            from layout import force_layout, layered_layout
+
+            if self.mode == "Layered":
+                result = layered_layout(self.node_count, self.edges, self.sizes)
+            else:
+                result = force_layout(self.node_count, self.edges, self.sizes, initial=self.positions)
+        except Exception as error:
+            self.error = error
+            self.done.emit(None)
+            return
+        self.done.emit(result.tolist())
 
 
 class FlowchartApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, profiler=None):
         super().__init__()
+        self.profiler = profiler
+        self.export_worker = None
+        self.layout_worker = None
+        self.autosave_lock = None
+        self.autosave_timer = None
         self.initUI()
 
     def initUI(self):
@@ -83,6 +292,35 @@ class FlowchartApp(QMainWindow):
         self.color_button.clicked.connect(self.selectColor)
         self.buttons_layout.addWidget(self.color_button)
 
+        self.undo_button = QPushButton("Undo")
+        self.undo_button.clicked.connect(self.scene.undo_stack.undo)
+        self.undo_button.setEnabled(False)
+        self.scene.undo_stack.canUndoChanged.connect(self.undo_button.setEnabled)
+        self.buttons_layout.addWidget(self.undo_button)
+
+        self.redo_button = QPushButton("Redo")
+        self.redo_button.clicked.connect(self.scene.undo_stack.redo)
+        self.redo_button.setEnabled(False)
+        self.scene.undo_stack.canRedoChanged.connect(self.redo_button.setEnabled)
+        self.buttons_layout.addWidget(self.redo_button)
+
+        self.layout_button = QPushButton("Auto Layout")
+        self.layout_button.clicked.connect(self.autoLayout)
+        self.buttons_layout.addWidget(self.layout_button)
+
+        self.routing_button = QPushButton("Orthogonal Connectors")
+        self.routing_button.setCheckable(True)
+        self.routing_button.toggled.connect(self.scene.setOrthogonalRouting)
+        self.routing_button.setChecked(True)
+        self.buttons_layout.addWidget(self.routing_button)
+
+        undo_action = self.scene.undo_stack.createUndoAction(self)
+        undo_action.setShortcut(QKeySequence.Undo)
+        self.addAction(undo_action)
+        redo_action = self.scene.undo_stack.createRedoAction(self)
+        redo_action.setShortcut(QKeySequence.Redo)
+        self.addAction(redo_action)
+
         self.zoom_in_button = QPushButton("Zoom In")
         self.zoom_in_button.clicked.connect(self.zoomIn)
         self.buttons_layout.addWidget(self.zoom_in_button)
@@ -91,6 +329,19 @@ class FlowchartApp(QMainWindow):
         self.zoom_out_button.clicked.connect(self.zoomOut)
         self.buttons_layout.addWidget(self.zoom_out_button)
 
+        self.fps_button = QPushButton("Show FPS")
+        self.fps_button.setCheckable(True)
+        self.fps_button.toggled.connect(self.view.setShowFps)
+        self.buttons_layout.addWidget(self.fps_button)
+
+        self.save_button = QPushButton("Save")
+        self.save_button.clicked.connect(self.saveDocument)
+        self.buttons_layout.addWidget(self.save_button)
+
+        self.open_button = QPushButton("Open")
+        self.open_button.clicked.connect(self.openDocument)
+        self.buttons_layout.addWidget(self.open_button)
+
         self.export_button = QPushButton("Export as PNG")
         self.export_button.clicked.connect(self.exportAsPNG)
         self.buttons_layout.addWidget(self.export_button)
@@ -122,25 +373,66 @@ class FlowchartApp(QMainWindow):
 
         self.shape_list.itemClicked.connect(self.addShape)
 
+        if self.profiler is not None:
+            from instrumentation import PerformanceHud
+
+            self.performance_hud = PerformanceHud(self.profiler, self)
+            self.addDockWidget(Qt.LeftDockWidgetArea, self.performance_hud)
+            self.splitDockWidget(self.shape_dock, self.performance_hud, Qt.Vertical)
+
     def addShape(self, item):
         shape_type = item.data(Qt.UserRole)
         if shape_type == 'square':
-            shape = ShapeItem(0, 0, 100, 100)
+            shape = self.scene.createShapeItem('rect', QRectF(0, 0, 100, 100))
         elif shape_type == 'rectangle':
-            shape = ShapeItem(0, 0, 150, 100)
+            shape = self.scene.createShapeItem('rect', QRectF(0, 0, 150, 100))
         elif shape_type == 'circle':
-            shape = QGraphicsEllipseItem(0, 0, 100, 100)
-            shape.setFlags(QGraphicsItem.ItemIsMovable | QGraphicsItem.ItemIsSelectable | QGraphicsItem.ItemSendsGeometryChanges)
+            shape = self.scene.createShapeItem('ellipse', QRectF(0, 0, 100, 100))
         else:
             return
 
         shape.setPen(QPen(Qt.black, 2))
-        self.scene.addItem(shape)
+        self.scene.pushCommand(AddItemsCommand(self.scene, [shape], "Add Shape"))
 
     def selectColor(self):
+        from PyQt5.QtWidgets import QColorDialog
+
         color = QColorDialog.getColor()
         if color.isValid():
             self.scene.setLineColor(color)
+            if self.scene.selectedItems():
+                self.scene.pushCommand(RecolorItemsCommand(self.scene, self.scene.selectedItems(), color.rgba()))
+
+    def autoLayout(self):
+        if self.layout_worker is not None:
+            return
+        from PyQt5.QtWidgets import QInputDialog
+
+        mode, ok = QInputDialog.getItem(self, "Auto Layout", "Layout:", LAYOUT_MODES, 0, False)
+        if not ok:
+            return
+        shapes, edges, sizes, positions = self.scene.layoutGraph()
+        if not shapes:
+            return
+        generation = self.scene.diagram_generation
+        self.layout_worker = LayoutWorker(mode, len(shapes), edges, sizes, positions, parent=self)
+        self.layout_worker.done.connect(lambda top_lefts: self.layoutFinished(shapes, top_lefts, generation))
+        self.layout_button.setEnabled(False)
+        self.layout_worker.start()
+
+    def layoutFinished(self, shapes, top_lefts, generation):
+        self.layout_worker.wait()
+        error = self.layout_worker.error
+        self.layout_worker = None
+        self.layout_button.setEnabled(True)
+        if generation != self.scene.diagram_generation:
+            return  # the diagram was cleared or replaced while the layout ran
+        if top_lefts is None:
+            from PyQt5.QtWidgets import QMessageBox
+
+            QMessageBox.warning(self, "Auto Layout", f"The layout failed:\n{error}")
+            return
+        self.scene.animateLayout(shapes, top_lefts)
 
     def zoomIn(self):
         self.view.scale(1.2, 1.2)
@@ -148,10 +440,109 @@ class FlowchartApp(QMainWindow):
     def zoomOut(self):
         self.view.scale(0.8, 0.8)
 
+    def saveDocument(self):
+        from PyQt5.QtWidgets import QFileDialog
+
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Flowchart", "", DOCUMENT_FILE_FILTER)
+        if not file_path:
+            return
+        try:
+            save_any(self.scene.toDocument(), file_path)
+        except OSError as error:
+            from PyQt5.QtWidgets import QMessageBox
+
+            QMessageBox.warning(self, "Save Flowchart", f"The flowchart could not be saved:\n{error}")
+
+    def openDocument(self):
+        from PyQt5.QtWidgets import QFileDialog
+
+        file_path, _ = QFileDialog.getOpenFileName(self, "Open Flowchart", "", DOCUMENT_FILE_FILTER)
+        if not file_path:
+            return
+        try:
+            document = load_any(file_path)
+        except (DocumentFormatError, OSError) as error:
+            from PyQt5.QtWidgets import QMessageBox
+
+            QMessageBox.warning(self, "Open Flowchart", f"The flowchart could not be opened:\n{error}")
+            return
+        self.scene.loadDocument(document)
+
     def exportAsPNG(self):
+        from PyQt5.QtWidgets import QFileDialog, QProgressDialog
+        from tiled_export import ExportWorker, snapshotScene
+
         file_path, _ = QFileDialog.getSaveFileName(self, "Export as PNG", "", "PNG Files (*.png);;All Files (*)")
-        if file_path:
-            self.scene.exportAsPNG(file_path)
+        if not file_path or self.export_worker is not None:
+            return
+        # Render from an immutable snapshot on a worker thread so the scene
+        # stays editable while the export runs.
+        self.export_worker = ExportWorker(snapshotScene(self.scene), file_path, parent=self)
+        progress_dialog = QProgressDialog("Exporting...", "Cancel", 0, 100, self)
+        progress_dialog.setWindowModality(Qt.NonModal)
+        progress_dialog.setMinimumDuration(500)
+        progress_dialog.canceled.connect(self.export_worker.cancel)
+        self.export_worker.progress.connect(lambda rows_done, total_rows: progress_dialog.setValue(int(rows_done * 100 / total_rows)))
+        self.export_worker.done.connect(lambda written: self.exportFinished(progress_dialog))
+        self.export_button.setEnabled(False)
+        self.export_worker.start()
+
+    def exportFinished(self, progress_dialog):
+        progress_dialog.close()
+        self.export_worker.wait()
+        error = self.export_worker.error
+        self.export_worker = None
+        self.export_button.setEnabled(True)
+        if error is not None:
+            from PyQt5.QtWidgets import QMessageBox
+
+            QMessageBox.warning(self, "Export as PNG", f"The PNG could not be exported:\n{error}")
+
+    def startAutosave(self, directory):
+        """Journal every edit to `directory`, first recovering an unfinished session.
+
+        Only one editor autosaves to a directory at a time; another one
+        keeps running without autosave.
+        """
+        os.makedirs(directory, exist_ok=True)
+        lock = QLockFile(os.path.join(directory, 'autosave.lock'))
+        if not lock.tryLock(0):
+            print(f"autosave disabled: {directory} is in use by another editor", file=sys.stderr)
+            return False
+        self.autosave_lock = lock
+        recovered = recover(directory)
+        generation = 0
+        if recovered is not None:
+            generation, document, records = recovered
+            if document is not None:
+                self.scene.loadDocument(document)
+                document.close()
+            self.scene.applyJournalRecords(records)
+            if records or (document is not None and len(document)):
+                self.statusBar().showMessage("Recovered the diagram from the last session", 10000)
+        # Never append to a journal the last session may have left torn.
+        self.scene.journal = Journal(directory, generation + 1)
+        if recovered is not None:
+            self.scene.journal.snapshot(self.scene.toDocument())
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.timeout.connect(self.compactAutosave)
+        self.autosave_timer.start(AUTOSAVE_COMPACT_MS)
+        return True
+
+    def compactAutosave(self):
+        journal = self.scene.journal
+        if journal is not None and journal.needs_compaction():
+            journal.snapshot(self.scene.toDocument())
+
+    def stopAutosave(self):
+        """Flush the journal and remove the autosave, as after a clean exit."""
+        if self.scene.journal is None:
+            return
+        self.autosave_timer.stop()
+        self.scene.journal.close(discard=True)
+        self.scene.journal = None
+        self.autosave_lock.unlock()
+        self.autosave_lock = None
 
 
 class FlowchartView(QGraphicsView):
@@ -159,22 +550,81 @@ class FlowchartView(QGraphicsView):
         super().__init__(scene)
         self.setRenderHint(QPainter.Antialiasing)
         self.grid_size = 20
+        self.min_grid_spacing = 4  # screen pixels; the grid is hidden below this
+        self.grid_brush = None
+        self.grid_brush_key = None
+        self.show_fps = False
+        self.frame_times = deque(maxlen=120)  # (end time, paint duration) per frame
 
-    def drawBackground(self, painter, rect):
-        super().drawBackground(painter, rect)
-        left = int(rect.left()) - (int(rect.left()) % self.grid_size)
-        top = int(rect.top()) - (int(rect.top()) % self.grid_size)
-        right = int(rect.right())
-        bottom = int(rect.bottom())
+    def setShowFps(self, show):
+        self.show_fps = show
+        self.viewport().update()
+
+    def paintEvent(self, event):
+        start = time.perf_counter()
+        super().paintEvent(event)
+        end = time.perf_counter()
+        self.frame_times.append((end, end - start))
 
-        lines = []
-        for x in range(left, right, self.grid_size):
-            lines.append(QLineF(x, top, x, bottom))
-        for y in range(top, bottom, self.grid_size):
-            lines.append(QLineF(left, y, right, y))
+    def drawForeground(self, painter, rect):
+        super().drawForeground(painter, rect)
+        if not self.show_fps or not self.frame_times:
+            return
+        now = time.perf_counter()
+        recent = [duration for end, duration in self.frame_times if now - end < 1.0]
+        average = sum(recent) / len(recent) * 1000 if recent else 0.0
+        painter.save()
+        painter.resetTransform()
+        painter.setPen(Qt.darkRed)
+        painter.drawText(10, 20, f"{len(recent)} FPS  {average:.1f} ms/frame")
+        painter.restore()
 
-        painter.setPen(QPen(Qt.lightGray))
-        painter.drawLines(lines)
+    def gridBrush(self, zoom):
+        key = (self.grid_size, zoom)
+        if key != self.grid_brush_key:
+            # Render a few grid cells at screen resolution and let the brush
+            # transform map the tile back onto exactly that many scene units.
+            cell = self.grid_size * zoom
+            cells = max(1, math.ceil(64 / cell))
+            while cells > 1 and cells * cell > GRID_TILE_LIMIT:
+                cells -= 1
+            tile_size = max(1, math.ceil(cells * cell))
+            tile = QPixmap(tile_size, tile_size)
+            tile.fill(Qt.transparent)
+            tile_painter = QPainter(tile)
+            tile_painter.setPen(QPen(Qt.lightGray))
+            for i in range(cells):
+                offset = round(i * tile_size / cells)
+                tile_painter.drawLine(offset, 0, offset, tile_size)
+                tile_painter.drawLine(0, offset, tile_size, offset)
+            tile_painter.end()
+
+            scale = cells * self.grid_size / tile_size
+            self.grid_brush = QBrush(tile)
+            self.grid_brush.setTransform(QTransform.fromScale(scale, scale))
+            self.grid_brush_key = key
+        return self.grid_brush
+
+    def drawBackground(self, painter, rect):
+        super().drawBackground(painter, rect)
+        zoom = self.transform().m11()
+        if self.grid_size * zoom < self.min_grid_spacing:
+            return
+        if self.grid_size * zoom > GRID_TILE_LIMIT:
+            # A tile would be huge, and only a few lines are visible anyway.
+            pen = QPen(Qt.lightGray)
+            pen.setCosmetic(True)  # one pixel wide at any zoom, like the tiles
+            painter.setPen(pen)
+            x = math.floor(rect.left() / self.grid_size) * self.grid_size
+            while x <= rect.right():
+                painter.drawLine(QLineF(x, rect.top(), x, rect.bottom()))
+                x += self.grid_size
+            y = math.floor(rect.top() / self.grid_size) * self.grid_size
+            while y <= rect.bottom():
+                painter.drawLine(QLineF(rect.left(), y, rect.right(), y))
+                y += self.grid_size
+            return
+        painter.fillRect(rect, self.gridBrush(zoom))
 
 
 class FlowchartScene(QGraphicsScene):
@@ -189,10 +639,599 @@ class FlowchartScene(QGraphicsScene):
         self.current_mode = None
         self.line_color = Qt.black
         self.lines = []
+        # shape -> set of ConnectorLines attached to it
+        self.connectors_by_item = {}
+        self.dirty_connectors = set()
+        self.batching_moves = False
+        self.next_item_id = 1
+        self.lod = LevelOfDetail()
+        self.undo_stack = QUndoStack(self)
+        self.undo_stack.setUndoLimit(UNDO_LIMIT)
+        self.undo_memory_budget = UNDO_MEMORY_BUDGET
+        self.undo_trim_count = 0
+        self.drag_id = 0
+        self.drag_items = ()
+        self.drag_anchor = None
+        self.drawing_item = None
+        self.drawing_geometry = None
+        self.layout_animation = None
+        self.bulk_updating = False
+        self.router = None
+        self.pending_routes = {}  # connectors waiting for a route, oldest first
+        self.route_budget = ROUTE_FRAME_BUDGET
+        self.route_timer = QTimer(self)
+        self.route_timer.setSingleShot(True)
+        self.route_timer.timeout.connect(self.routePending)
+        self.journal = None  # journal.Journal recording edits for crash recovery
+        self.diagram_generation = 0  # bumped whenever the items are cleared
+
+    def addItem(self, item):
+        if item.data(ITEM_ID) is None:
+            item.setData(ITEM_ID, self.next_item_id)
+            self.next_item_id += 1
+        super().addItem(item)
+        if self.router is not None and isinstance(item, SHAPE_ITEM_TYPES):
+            self.queueRoutes(self.router.set_obstacle(item, obstacleRect(item)))
+
+    def clearDiagram(self):
+        self.diagram_generation += 1
+        if self.layout_animation is not None:
+            self.layout_animation.stop()
+            self.layout_animation = None
+        self.undo_stack.clear()
+        self.undo_trim_count = 0
+        self.clear()
+        self.lines = []
+        self.connectors_by_item = {}
+        self.dirty_connectors = set()
+        self.pending_routes = {}
+        if self.router is not None:
+            self.router.clear()
+        if self.journal is not None:
+            self.journal.append(encode_record(OP_CLEAR, 0))
+
+    def createShapeItem(self, kind, rect):
+        if kind == 'rect':
+            return ShapeItem(rect)  # sets its own flags
+        if kind == 'ellipse':
+            shape = EllipseItem(rect)
+        else:
+            shape = DiamondItem(QPolygonF([QPointF(rect.center().x(), rect.top()), QPointF(rect.right(), rect.center().y()),
+                                           QPointF(rect.center().x(), rect.bottom()), QPointF(rect.left(), rect.center().y())]))
+        shape.setFlags(QGraphicsItem.ItemIsMovable | QGraphicsItem.ItemIsSelectable | QGraphicsItem.ItemSendsGeometryChanges)
+        return shape
+
+    def createLineItem(self, x1, y1, x2, y2, rgba):
+        line = QGraphicsLineItem(x1, y1, x2, y2)
+        line.setPen(QPen(QColor.fromRgba(rgba), 2))
+        return line
+
+    def createTextItem(self, x, y, text, rgba):
+        text_item = TextItem(text)
+        text_item.setDefaultTextColor(QColor.fromRgba(rgba))
+        text_item.setPos(x, y)
+        text_item.setFlags(QGraphicsItem.ItemIsMovable | QGraphicsItem.ItemIsSelectable)
+        return text_item
+
+    def toDocument(self):
+        document = Document()
+        shape_index = {}
+        connectors = []
+        for item in self.items(Qt.AscendingOrder):
+            item_id = item.data(ITEM_ID)
+            if isinstance(item, ConnectorLine):
+                connectors.append(item)
+            elif isinstance(item, SHAPE_ITEM_TYPES):
+                kind, rect = sceneShape(item)
+                fill = item.brush().color().rgba() if item.brush().style() != Qt.NoBrush else 0
+                shape_index[item] = document.add_shape(kind, rect.x(), rect.y(), rect.width(), rect.height(),
+                                                       item.pen().color().rgba(), fill, shape_id=item_id)
+            elif isinstance(item, QGraphicsLineItem):
+                line = item.line()
+                p1, p2 = item.mapToScene(line.p1()), item.mapToScene(line.p2())
+                document.add_line(p1.x(), p1.y(), p2.x(), p2.y(), item.pen().color().rgba(), line_id=item_id)
+            elif isinstance(item, QGraphicsTextItem):
+                pos = item.scenePos()
+                document.add_text(pos.x(), pos.y(), item.toPlainText(), item.defaultTextColor().rgba(), text_id=item_id)
+        for connector in connectors:
+            if connector.start_item in shape_index and connector.end_item in shape_index:
+                document.add_connector(shape_index[connector.start_item], shape_index[connector.end_item],
+                                       connector.pen().color().rgba(), connector_id=connector.data(ITEM_ID))
+        return document
+
+    @contextmanager
+    def bulkUpdate(self):
+        """Suspend indexing, scene signals and view repaints for a batch of edits.
+
+        The BSP index is rebuilt once and the views repaint once at the end.
+        Nested batches only take effect at the outermost level.
+        """
+        if self.bulk_updating:
+            yield
+            return
+        self.bulk_updating = True
+        index_method = self.itemIndexMethod()
+        self.setItemIndexMethod(QGraphicsScene.NoIndex)
+        signals_blocked = self.blockSignals(True)
+        views = [view for view in self.views() if view.updatesEnabled()]
+        for view in views:
+            view.setUpdatesEnabled(False)
+        try:
+            yield
+        finally:
+            self.blockSignals(signals_blocked)
+            self.setItemIndexMethod(index_method)
+            # Views follow the scene rect through this signal, which was blocked.
+            self.sceneRectChanged.emit(self.sceneRect())
+            for view in views:
+                view.setUpdatesEnabled(True)
+                view.viewport().update()
+            self.bulk_updating = False
+            self.routePending()
+
+    def addShapes(self, kinds, geometry, strokes=None, fills=None, connectors=(), connector_strokes=None,
+                  shape_ids=None, connector_ids=None):
+        """Add many shapes, and connectors between them, in one batch.
+
+        kinds holds SHAPE_KINDS indices and geometry (x, y, width, height)
+        rows. Colors are 0xAARRGGBB values, with a fill of 0 meaning none;
+        strokes default to black. connectors holds (source, target) index
+        pairs into the new shapes. Lists, arrays, memoryviews and NumPy arrays
+        are all accepted. Items get fresh ids unless ids are given. The insert
+        is not recorded on the undo stack. Returns (shapes, connectors).
+        """
+        kinds = _values(kinds)
+        geometry = _values(geometry)
+        connectors = _values(connectors)
+        strokes = _values(strokes) if strokes is not None else [0xff000000] * len(kinds)
+        fills = _values(fills) if fills is not None else [0] * len(kinds)
+        connector_strokes = _values(connector_strokes) if connector_strokes is not None else [0xff000000] * len(connectors)
+        first_id = self.next_item_id
+        shape_ids = _values(shape_ids) if shape_ids is not None else range(first_id, first_id + len(kinds))
+        first_id += len(kinds)
+        connector_ids = _values(connector_ids) if connector_ids is not None else range(first_id, first_id + len(connectors))
+        pens = {}
+
+        def pen(rgba):
+            if rgba not in pens:
+                pens[rgba] = QPen(QColor.fromRgba(rgba), 2)
+            return pens[rgba]
+
+        # Ids are set here, so items go straight to QGraphicsScene.addItem,
+        # and connector ends come from the geometry rows instead of
+        # ConnectorLine.updatePosition.
+        add_item = super().addItem
+        connectors_by_item = self.connectors_by_item
+        shapes = []
+        centres = []
+        new_connectors = []
+        with self.bulkUpdate():
+            for kind, (x, y, width, height), stroke, fill, shape_id in zip(kinds, geometry, strokes, fills, shape_ids):
+                shape = self.createShapeItem(SHAPE_KINDS[kind], QRectF(x, y, width, height))
+                shape.setPen(pen(stroke))
+                if fill:
+                    shape.setBrush(QColor.fromRgba(fill))
+                shape.setData(ITEM_ID, shape_id)
+                add_item(shape)
+                shapes.append(shape)
+                centres.append((x + width / 2, y + height / 2))
+            for (source, target), stroke, connector_id in zip(connectors, connector_strokes, connector_ids):
+                start_item, end_item = shapes[source], shapes[target]
+                connector = ConnectorLine(start_item, end_item, *centres[source], *centres[target])
+                connector.setPen(pen(stroke))
+                connector.setData(ITEM_ID, connector_id)
+                add_item(connector)
+                connectors_by_item.setdefault(start_item, set()).add(connector)
+                connectors_by_item.setdefault(end_item, set()).add(connector)
+                new_connectors.append(connector)
+            self.lines.extend(new_connectors)
+            if self.router is not None:
+                for shape in shapes:
+                    self.router.set_obstacle(shape, obstacleRect(shape))
+                self.queueRoutes(new_connectors)
+        self.next_item_id = max(self.next_item_id, max(shape_ids, default=0) + 1, max(connector_ids, default=0) + 1)
+        self.journalItems('presence', shapes + new_connectors)
+        return shapes, new_connectors
+
+    def loadDocument(self, document):
+        # The journal restarts from a snapshot of the loaded diagram instead
+        # of recording every item.
+        journal, self.journal = self.journal, None
+        try:
+            self.clearDiagram()
+            columns = document.columns
+            with self.bulkUpdate():
+                self.addShapes(columns['shape_kind'],
+                               zip(columns['shape_x'], columns['shape_y'], columns['shape_w'], columns['shape_h']),
+                               columns['shape_stroke'], columns['shape_fill'],
+                               zip(columns['connector_src'], columns['connector_dst']), columns['connector_stroke'],
+                               columns['shape_id'], columns['connector_id'])
+                for i in range(document.line_count):
+                    line = self.createLineItem(columns['line_x1'][i], columns['line_y1'][i], columns['line_x2'][i],
+                                               columns['line_y2'][i], columns['line_stroke'][i])
+                    line.setData(ITEM_ID, columns['line_id'][i])
+                    self.addItem(line)
+                for i in range(document.text_count):
+                    text_item = self.createTextItem(columns['text_x'][i], columns['text_y'][i], document.text(i),
+                                                    columns['text_color'][i])
+                    text_item.setData(ITEM_ID, columns['text_id'][i])
+                    self.addItem(text_item)
+            ids = [max(columns[name], default=0) for name in ('shape_id', 'connector_id', 'line_id', 'text_id')]
+            self.next_item_id = max(ids) + 1
+        finally:
+            self.journal = journal
+        if journal is not None:
+            journal.snapshot(self.toDocument())
+
+    def journalItems(self, change, items):
+        """Record the current state of items an edit touched in the journal.
+
+        change is a SceneCommand.journal_change. For 'presence', items that
+        are no longer in the scene are recorded as deleted and the others as
+        added, connectors after the shapes they join.
+        """
+        journal = self.journal
+        if journal is None or change is None:
+            return
+        if change == 'presence':
+            present = [item for item in items if item.scene() is self]
+            for item in items:
+                if item.scene() is not self and item.data(ITEM_ID) is not None:
+                    journal.append(encode_record(OP_DELETE, item.data(ITEM_ID)))
+            present.sort(key=lambda item: isinstance(item, ConnectorLine))
+            for item in present:
+                journal.append(self.journalAddRecord(item))
+            return
+        for item in items:
+            if item.scene() is not self:
+                continue
+            item_id = item.data(ITEM_ID)
+            if change == 'move':
+                anchor = journalAnchor(item)
+                journal.append(encode_record(OP_MOVE, item_id, anchor.x(), anchor.y()))
+            elif change == 'resize':
+                if isinstance(item, QGraphicsLineItem):
+                    line = item.line()
+                    p1, p2 = item.mapToScene(line.p1()), item.mapToScene(line.p2())
+                    journal.append(encode_record(OP_RESIZE, item_id, p1.x(), p1.y(), p2.x(), p2.y()))
+                else:
+                    rect = sceneShape(item)[1]
+                    journal.append(encode_record(OP_RESIZE, item_id, rect.x(), rect.y(), rect.width(), rect.height()))
+            elif change == 'recolor':
+                journal.append(encode_record(OP_RECOLOR, item_id, itemColor(item)))
+
+    def journalAddRecord(self, item):
+        item_id = item.data(ITEM_ID)
+        if isinstance(item, ConnectorLine):
+            return encode_record(OP_CONNECT, item_id, item.start_item.data(ITEM_ID), item.end_item.data(ITEM_ID),
+                                 item.pen().color().rgba())
+        if isinstance(item, SHAPE_ITEM_TYPES):
+            kind, rect = sceneShape(item)
+            fill = item.brush().color().rgba() if item.brush().style() != Qt.NoBrush else 0
+            return encode_record(OP_ADD_SHAPE, item_id, SHAPE_KINDS.index(kind), rect.x(), rect.y(), rect.width(),
+                                 rect.height(), item.pen().color().rgba(), fill)
+        if isinstance(item, QGraphicsLineItem):
+            line = item.line()
+            p1, p2 = item.mapToScene(line.p1()), item.mapToScene(line.p2())
+            return encode_record(OP_ADD_LINE, item_id, p1.x(), p1.y(), p2.x(), p2.y(), item.pen().color().rgba())
+        pos = item.scenePos()
+        return encode_record(OP_ADD_TEXT, item_id, pos.x(), pos.y(), item.defaultTextColor().rgba(), item.toPlainText())
+
+    def applyJournalRecords(self, records):
+        """Replay records from journal.recover() onto the diagram.
+
+        Records hold the state edits left behind, so the ones already
+        reflected in the loaded snapshot change nothing. Nothing is added to
+        the undo stack or the journal.
+        """
+        journal, self.journal = self.journal, None
+        items = {item.data(ITEM_ID): item for item in self.items()}
+        self.batching_moves = True
+        try:
+            with self.bulkUpdate():
+                for op, item_id, *fields in records:
+                    if op == OP_CLEAR:
+                        self.clearDiagram()
+                        items = {}
+                        continue
+                    if op in (OP_ADD_SHAPE, OP_ADD_LINE, OP_ADD_TEXT, OP_CONNECT):
+                        existing = items.pop(item_id, None)
+                        if existing is not None and existing.scene() is self:
+                            self.removeItem(existing)
+                        self.next_item_id = max(self.next_item_id, item_id + 1)
+                    if op == OP_ADD_SHAPE:
+                        kind, x, y, width, height, stroke, fill = fields
+                        item = self.createShapeItem(SHAPE_KINDS[kind], QRectF(x, y, width, height))
+                        item.setPen(QPen(QColor.fromRgba(stroke), 2))
+                        if fill:
+                            item.setBrush(QColor.fromRgba(fill))
+                    elif op == OP_ADD_LINE:
+                        item = self.createLineItem(*fields)
+                    elif op == OP_ADD_TEXT:
+                        x, y, color, text = fields
+                        item = self.createTextItem(x, y, text, color)
+                    elif op == OP_CONNECT:
+                        start_item, end_item = items.get(fields[0]), items.get(fields[1])
+                        if start_item is None or end_item is None:
+                            continue
+                        item = ConnectorLine(start_item, end_item)
+                        item.setPen(QPen(QColor.fromRgba(fields[2]), 2))
+                        item.setData(ITEM_ID, item_id)
+                        self.addConnectorItem(item)
+                        items[item_id] = item
+                        continue
+                    else:
+                        item = items.get(item_id)
+                        if item is None or item.scene() is not self:
+                            continue
+                        if op == OP_MOVE:
+                            anchor = journalAnchor(item)
+                            item.moveBy(fields[0] - anchor.x(), fields[1] - anchor.y())
+                        elif op == OP_RESIZE:
+                            if isinstance(item, QGraphicsLineItem):
+                                item.setLine(QLineF(item.mapFromScene(fields[0], fields[1]), item.mapFromScene(fields[2], fields[3])))
+                            elif isinstance(item, (QGraphicsRectItem, QGraphicsEllipseItem)):
+                                item.setRect(item.mapRectFromScene(QRectF(*fields)))
+                            self.markConnectorsDirty(item)
+                        elif op == OP_RECOLOR:
+                            setItemColor(item, fields[0])
+                        elif op == OP_DELETE:
+                            self.removeItem(item)
+                            del items[item_id]
+                        continue
+                    item.setData(ITEM_ID, item_id)
+                    self.addItem(item)
+                    items[item_id] = item
+        finally:
+            self.batching_moves = False
+            self.journal = journal
+        self.flushConnectorUpdates()
 
     def setMode(self, mode):
         self.current_mode = mode
 
+    def addConnector(self, start_item, end_item):
+        return self.addConnectorItem(ConnectorLine(start_item, end_item))
+
+    def addConnectorItem(self, connector):
+        start_item, end_item = connector.start_item, connector.end_item
+        connector.updatePosition()
+        self.lines.append(connector)
+        self.connectors_by_item.setdefault(start_item, set()).add(connector)
+        self.connectors_by_item.setdefault(end_item, set()).add(connector)
+        self.addItem(connector)
+        if self.router is not None:
+            self.queueRoutes([connector])
+        return connector
+
+    def removeConnector(self, connector):
+        for item in (connector.start_item, connector.end_item):
+            connectors = self.connectors_by_item.get(item)
+            if connectors is not None:
+                connectors.discard(connector)
+                if not connectors:
+                    del self.connectors_by_item[item]
+        self.dirty_connectors.discard(connector)
+        self.pending_routes.pop(connector, None)
+        if self.router is not None:
+            self.router.forget(connector)
+        if connector in self.lines:
+            self.lines.remove(connector)
+        super().removeItem(connector)
+
+    def removeItem(self, item):
+        if isinstance(item, ConnectorLine):
+            self.removeConnector(item)
+            return
+        for connector in list(self.connectors_by_item.get(item, ())):
+            self.removeConnector(connector)
+        super().removeItem(item)
+        if self.router is not None and isinstance(item, SHAPE_ITEM_TYPES):
+            self.queueRoutes(self.router.remove_obstacle(item))
+
+    def markConnectorsDirty(self, item):
+        connectors = self.connectors_by_item.get(item)
+        if self.router is not None and isinstance(item, SHAPE_ITEM_TYPES) and item.scene() is self:
+            # Routes crossing the shape's old or new rect must be found again.
+            self.pending_routes.update(dict.fromkeys(self.router.set_obstacle(item, obstacleRect(item))))
+        elif not connectors:
+            return
+        if connectors:
+            self.dirty_connectors.update(connectors)
+        if not self.batching_moves:
+            self.flushConnectorUpdates()
+
+    def setOrthogonalRouting(self, enabled):
+        if enabled == (self.router is not None):
+            return
+        self.pending_routes = {}
+        if not enabled:
+            self.router = None
+            for connector in self.lines:
+                connector.setRoute(None)
+            return
+        self.router = ConnectorRouter()
+        for item in self.items():
+            if isinstance(item, SHAPE_ITEM_TYPES):
+                self.router.set_obstacle(item, obstacleRect(item))
+        self.queueRoutes(self.lines)
+
+    def queueRoutes(self, connectors):
+        self.pending_routes.update(dict.fromkeys(connectors))
+        self.routePending()
+
+    def routePending(self):
+        """Route queued connectors until this call's time budget is spent.
+
+        Whatever is left is routed from a zero-delay timer over the next
+        frames. Until then, connectors whose shapes moved stay straight.
+        """
+        if self.router is None or not self.pending_routes or self.bulk_updating:
+            return
+        deadline = time.perf_counter() + self.route_budget
+        pending = self.pending_routes
+        while pending and time.perf_counter() < deadline:
+            connector = next(iter(pending))
+            del pending[connector]
+            if connector.scene() is not self:
+                continue
+            start_item, end_item = connector.start_item, connector.end_item
+            connector.setRoute(self.router.route(connector, obstacleRect(start_item), obstacleRect(end_item),
+                                                 (start_item, end_item)))
+        if pending:
+            self.route_timer.start(0)
+
+    def moveItemsBy(self, items, dx, dy):
+        self.batching_moves = True
+        try:
+            for item in items:
+                item.moveBy(dx, dy)
+        finally:
+            self.batching_moves = False
+            self.flushConnectorUpdates()
+
+    def setItemPositions(self, items, positions):
+        self.batching_moves = True
+        try:
+            for item, (x, y) in zip(items, positions):
+                if item.scene() is self:
+                    item.setPos(x, y)
+                    self.markConnectorsDirty(item)
+        finally:
+            self.batching_moves = False
+            self.flushConnectorUpdates()
+
+    def layoutGraph(self):
+        """Return (shapes, edges, sizes, top_lefts) for the layout module.
+
+        Edges are (source, target) index pairs into shapes, one per connector.
+        Sizes and top-lefts come from the shapes' scene bounding rects.
+        """
+        shapes = [item for item in self.items(Qt.AscendingOrder) if isinstance(item, SHAPE_ITEM_TYPES)]
+        index = {shape: i for i, shape in enumerate(shapes)}
+        edges = [(index[connector.start_item], index[connector.end_item]) for connector in self.lines
+                 if connector.start_item in index and connector.end_item in index]
+        rects = [shape.sceneBoundingRect() for shape in shapes]
+        sizes = [(rect.width(), rect.height()) for rect in rects]
+        top_lefts = [(rect.x(), rect.y()) for rect in rects]
+        return shapes, edges, sizes, top_lefts
+
+    def animateLayout(self, shapes, top_lefts):
+        """Move shapes to the bounding-rect top-lefts computed by a layout.
+
+        The layout is anchored at the diagram's current top-left corner. The
+        whole move is one undoable command.
+        """
+        placed = [(shape, top_left) for shape, top_left in zip(shapes, top_lefts)
+                  if not sip.isdeleted(shape) and shape.scene() is self]
+        if not placed or self.layout_animation is not None:
+            return
+        rects = [shape.sceneBoundingRect() for shape, top_left in placed]
+        origin_x = min(rect.x() for rect in rects)
+        origin_y = min(rect.y() for rect in rects)
+        items = tuple(shape for shape, top_left in placed)
+        start = tuple((shape.x(), shape.y()) for shape in items)
+        end = tuple((x + origin_x + shape.x() - rect.x(), y + origin_y + shape.y() - rect.y())
+                    for (shape, (x, y)), rect in zip(placed, rects))
+        if len(items) > LAYOUT_ANIMATION_LIMIT:
+            self.finishLayout(items, start, end)
+            return
+
+        def step(progress):
+            self.setItemPositions(items, [(x0 + (x1 - x0) * progress, y0 + (y1 - y0) * progress)
+                                          for (x0, y0), (x1, y1) in zip(start, end)])
+
+        self.layout_animation = QVariantAnimation(self)
+        self.layout_animation.setStartValue(0.0)
+        self.layout_animation.setEndValue(1.0)
+        self.layout_animation.setDuration(LAYOUT_ANIMATION_MS)
+        self.layout_animation.setEasingCurve(QEasingCurve.InOutCubic)
+        self.layout_animation.valueChanged.connect(step)
+        self.layout_animation.finished.connect(lambda: self.finishLayout(items, start, end))
+        self.layout_animation.start(QVariantAnimation.DeleteWhenStopped)
+
+    def finishLayout(self, items, start, end):
+        self.layout_animation = None
+        self.setItemPositions(items, end)
+        self.pushCommand(RepositionItemsCommand(self, items, start, end, applied=True))
+
+    def pushCommand(self, command):
+        self.undo_stack.push(command)
+        self.trimUndoHistory()
+
+    def trimUndoHistory(self):
+        # Merged drag commands do not change the count, so only re-measure
+        # the history when a command was actually added or dropped.
+        count = self.undo_stack.count()
+        if count == self.undo_trim_count:
+            return
+        self.undo_trim_count = count
+        total = 0
+        for i in reversed(range(count)):
+            command = self.undo_stack.command(i)
+            total += commandCost(command)
+            if total > self.undo_memory_budget and i < min(count - 1, self.undo_stack.index()):
+                releaseCommand(command)
+
+    def beginDrawing(self, item, text):
+        self.undo_stack.beginMacro(text)
+        self.pushCommand(AddItemsCommand(self, [item], text, applied=True))
+        self.drawing_item = item
+        self.drawing_geometry = itemGeometry(item)
+
+    def updateDrawing(self):
+        if self.drawing_item is None:
+            return
+        geometry = itemGeometry(self.drawing_item)
+        if geometry != self.drawing_geometry:
+            self.pushCommand(ResizeItemCommand(self, self.drawing_item, self.drawing_geometry, geometry, self.drag_id, applied=True))
+            self.drawing_geometry = geometry
+            self.markConnectorsDirty(self.drawing_item)
+
+    def endDrawing(self):
+        if self.drawing_item is None:
+            return
+        self.updateDrawing()
+        self.undo_stack.endMacro()
+        self.drawing_item = None
+
+    def startDrag(self):
+        self.drag_id += 1
+        self.drag_items = tuple(item for item in self.selectedItems() if item.flags() & QGraphicsItem.ItemIsMovable)
+        self.drag_anchor = self.drag_items[0].pos() if self.drag_items else None
+
+    def recordDrag(self):
+        # Qt moves every selected item by the same delta, so one item's
+        # position tracks the whole drag.
+        if not self.drag_items:
+            return
+        pos = self.drag_items[0].pos()
+        delta = pos - self.drag_anchor
+        if delta.x() or delta.y():
+            self.pushCommand(MoveItemsCommand(self, self.drag_items, delta.x(), delta.y(), self.drag_id, applied=True))
+            self.drag_anchor = pos
+
+    def keyPressEvent(self, event):
+        if event.key() in (Qt.Key_Delete, Qt.Key_Backspace) and self.selectedItems() and self.focusItem() is None:
+            self.pushCommand(DeleteItemsCommand(self, self.selectedItems()))
+            return
+        super().keyPressEvent(event)
+
+    def flushConnectorUpdates(self):
+        dirty = self.dirty_connectors
+        self.dirty_connectors = set()
+        for connector in dirty:
+            connector.updatePosition()
+        if self.router is not None and dirty:
+            # Connectors whose shapes moved go first and are drawn straight
+            # until routed.
+            for connector in dirty:
+                connector.setRoute(None)
+            queue = dict.fromkeys(dirty)
+            queue.update(self.pending_routes)
+            self.pending_routes = queue
+        self.routePending()
+
     def setLineColor(self, color):
         self.line_color = color
 
@@ -208,6 +1247,7 @@ class FlowchartScene(QGraphicsScene):
                 pen = QPen(self.line_color, 2)
                 self.line.setPen(pen)
                 self.addItem(self.line)
+                self.beginDrawing(self.line, "Draw Line")
             elif self.current_mode == 'connector':
                 self.start_item = self.itemAt(self.start_point, QTransform())
                 if self.start_item:
@@ -220,22 +1260,39 @@ class FlowchartScene(QGraphicsScene):
                 pen = QPen(self.line_color, 2)
                 self.rect.setPen(pen)
                 self.addItem(self.rect)
+                self.beginDrawing(self.rect, "Draw Rectangle")
             elif self.current_mode == 'circle':
-                self.ellipse = QGraphicsEllipseItem(0, 0, 0, 0)
+                self.ellipse = EllipseItem(0, 0, 0, 0)
                 pen = QPen(self.line_color, 2)
                 self.ellipse.setPen(pen)
                 self.addItem(self.ellipse)
+                self.beginDrawing(self.ellipse, "Draw Circle")
             elif self.current_mode == 'text':
+                from PyQt5.QtWidgets import QInputDialog
+
                 text, ok = QInputDialog.getText(None, "Input Text", "Enter your text:")
                 if ok and text:
-                    self.text_item = QGraphicsTextItem(text)
+                    self.text_item = TextItem(text)
                     self.text_item.setDefaultTextColor(self.line_color)
                     self.text_item.setPos(self.start_point)
                     self.text_item.setFlags(QGraphicsItem.ItemIsMovable | QGraphicsItem.ItemIsSelectable)
                     self.addItem(self.text_item)
+                    self.pushCommand(AddItemsCommand(self, [self.text_item], "Add Text", applied=True))
         super().mousePressEvent(event)
+        if event.button() == Qt.LeftButton:
+            self.startDrag()
 
     def mouseMoveEvent(self, event):
+        # Moving a multi-selection calls itemChange once per item; collect the
+        # affected connectors and update each of them once after the move.
+        self.batching_moves = True
+        try:
+            self._mouseMoveEvent(event)
+        finally:
+            self.batching_moves = False
+            self.flushConnectorUpdates()
+
+    def _mouseMoveEvent(self, event):
         end_point = event.scenePos()
         if self.current_mode == 'line' and self.line is not None:
             self.line.setLine(QLineF(self.start_point, end_point))
@@ -252,7 +1309,9 @@ class FlowchartScene(QGraphicsScene):
             rect = QRectF(self.start_point, end_point).normalized()
             diameter = min(rect.width(), rect.height())
             self.ellipse.setRect(rect.topLeft().x(), rect.topLeft().y(), diameter, diameter)
+        self.updateDrawing()
         super().mouseMoveEvent(event)
+        self.recordDrag()
 
     def mouseReleaseEvent(self, event):
         if event.button() == Qt.LeftButton:
@@ -261,13 +1320,12 @@ class FlowchartScene(QGraphicsScene):
                 self.line.setLine(QLineF(self.start_point, end_point))
                 self.line = None
             elif self.current_mode == 'connector' and self.connector is not None:
-                self.end_item = self.itemAt(end_point, QTransform())
-                if self.start_item and self.end_item and self.start_item != self.end_item:
-                    connector = ConnectorLine(self.start_item, self.end_item)
-                    self.lines.append(connector)
-                    self.addItem(connector)
+                # Remove the preview first so itemAt finds the shape under it.
                 self.removeItem(self.connector)
                 self.connector = None
+                self.end_item = self.itemAt(end_point, QTransform())
+                if self.start_item and self.end_item and self.start_item != self.end_item:
+                    self.pushCommand(ConnectCommand(self, ConnectorLine(self.start_item, self.end_item)))
             elif self.current_mode in ['square', 'rectangle'] and self.rect is not None:
                 rect = QRectF(self.start_point, end_point).normalized()
                 if self.current_mode == 'square':
@@ -281,27 +1339,76 @@ class FlowchartScene(QGraphicsScene):
                 diameter = min(rect.width(), rect.height())
                 self.ellipse.setRect(rect.topLeft().x(), rect.topLeft().y(), diameter, diameter)
                 self.ellipse = None
+            self.endDrawing()
         super().mouseReleaseEvent(event)
+        if event.button() == Qt.LeftButton:
+            self.recordDrag()
+            self.drag_items = ()
+
+    def exportAsPNG(self, file_path, scale=1.0, progress=None):
+        from tiled_export import exportSceneTiled
 
-    def exportAsPNG(self, file_path):
-        rect = self.sceneRect()
-        image = QImage(int(rect.width()), int(rect.height()), QImage.Format_ARGB32)
-        image.fill(Qt.white)
-        painter = QPainter(image)
-        self.render(painter)
-        painter.end()
-        image.save(file_path)
+        return exportSceneTiled(self, file_path, scale=scale, progress=progress)
 
-    def wheelEvent(self, event: QWheelEvent):
+    def wheelEvent(self, event):
         if event.modifiers() == Qt.ControlModifier:
-            if event.angleDelta().y() > 0:
+            # Scene wheel events carry delta(), not angleDelta().
+            if event.delta() > 0:
                 self.views()[0].scale(1.2, 1.2)
             else:
                 self.views()[0].scale(0.8, 0.8)
+            event.accept()
+
+
+def instrumentHotPaths(profiler):
+    """Time the editor's known hot paths; call before creating any items."""
+    profiler.instrument(FlowchartView, 'paintEvent', "frame")
+    profiler.instrument(FlowchartView, 'drawBackground')
+    profiler.instrumentEvents(FlowchartView, 'viewportEvent', "view event")
+    profiler.instrumentEvents(FlowchartScene, 'event', "scene event")
+    for cls in (ShapeItem, EllipseItem, DiamondItem):
+        profiler.instrument(cls, 'itemChange')
+    for cls in (ShapeItem, EllipseItem, DiamondItem, TextItem, ConnectorLine):
+        profiler.instrument(cls, 'paint')
+    for method in ('itemAt', 'markConnectorsDirty', 'flushConnectorUpdates', 'routePending'):
+        profiler.instrument(FlowchartScene, method)
+    profiler.instrument(LayoutWorker, 'run', "LayoutWorker.run")
+
+
+def autosaveDirectory():
+    """The autosave directory; FLOWCHART_AUTOSAVE overrides it, or turns autosave off with 0."""
+    directory = os.environ.get('FLOWCHART_AUTOSAVE')
+    if directory == '0':
+        return None
+    if directory:
+        return directory
+    from PyQt5.QtCore import QStandardPaths
+
+    return os.path.join(QStandardPaths.writableLocation(QStandardPaths.GenericDataLocation), 'flowchart-drawer', 'autosave')
 
 
 if __name__ == '__main__':
+    imports_done = time.perf_counter()
+    trace_file = profileTarget(sys.argv)
+    startup_target = startupTimingTarget(sys.argv)
+    profiler = None
+    if trace_file:
+        profiler = Profiler()
+        instrumentHotPaths(profiler)
     app = QApplication(sys.argv)
-    game = FlowchartApp()
+    game = FlowchartApp(profiler)
     game.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    if startup_target:
+        startup_timer = FirstPaintTimer(game.view.viewport(), STARTUP_CLOCK, startup_target)
+        startup_timer.mark("imports", imports_done)
+        startup_timer.mark("window shown")
+    autosave_directory = autosaveDirectory()
+    if autosave_directory and not startup_target:
+        game.startAutosave(autosave_directory)
+    status = app.exec_()
+    game.stopAutosave()
+    if profiler is not None:
+        profiler.writeChromeTrace(trace_file)
+        profiler.printSummary()
+        print(f"trace written to {os.path.abspath(trace_file)}", file=sys.stderr)
+    sys.exit(status)
\ No newline at end of file
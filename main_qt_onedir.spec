@@ -0,0 +1,95 @@
+# -*- mode: python ; coding: utf-8 -*-
+# One-folder build of the Qt editor that starts faster than main_qt.spec:
+# nothing is unpacked to a temporary directory on launch, binaries are not
+# UPX-compressed, and unused modules and Qt plugins are left out.
+#
+#   pyinstaller main_qt_onedir.spec  ->  dist/main_qt/main_qt
+
+
+# Modules the editor never imports; some are pulled in by hooks otherwise.
+EXCLUDES = [
+    'tkinter',
+    'main_tkinter',
+    'render_batch',
+    'pydoc',
+    'doctest',
+    'PyQt5.QtDBus',
+    'PyQt5.QtMultimedia',
+    'PyQt5.QtNetwork',
+    'PyQt5.QtPrintSupport',
+    'PyQt5.QtQml',
+    'PyQt5.QtQuick',
+    'PyQt5.QtSql',
+    'PyQt5.QtSvg',
+    'PyQt5.QtTest',
+    'PyQt5.QtWebEngineWidgets',
+]
+
+# Qt plugin folders to keep. Images are written by QImage, whose PNG support
+# is built in, so no imageformats plugins are needed.
+KEEP_PLUGIN_DIRS = {'platforms', 'styles'}
+KEEP_PLATFORMS = ('qwindows', 'qcocoa', 'qxcb', 'qoffscreen')
+
+
+def keep(entry):
+    dest = entry[0].replace('\\', '/')
+    if '/Qt5/translations/' in dest or '/Qt/translations/' in dest:
+        return False
+    _, found, rest = dest.partition('/plugins/')
+    if not found:
+        return True
+    folder, _, file_name = rest.partition('/')
+    if folder not in KEEP_PLUGIN_DIRS:
+        return False
+    return folder != 'platforms' or any(name in file_name for name in KEEP_PLATFORMS)
+
+
+a = Analysis(
+    ['main_qt.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=[],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=EXCLUDES,
+    noarchive=False,
+    optimize=0,
+)
+a.binaries = [entry for entry in a.binaries if keep(entry)]
+a.datas = [entry for entry in a.datas if keep(entry)]
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='main_qt',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=False,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='main_qt',
+)
+app = BUNDLE(
+    coll,
+    name='main_qt.app',
+    icon=None,
+    bundle_identifier=None,
+)
@@ -1,6 +1,135 @@
 import tkinter as tk
-from tkinter import colorchooser
+from tkinter import colorchooser, filedialog
 import math
+from bisect import bisect_left
+
+from document import Document, SHAPE_KINDS, load_any, save_any
+from spatial import RectIndex
+
+CANVAS_SHAPE_KINDS = {'rectangle': 'rect', 'oval': 'ellipse', 'polygon': 'diamond'}
+DOCUMENT_FILE_TYPES = [("Flowchart Files", "*.flow"), ("JSON Files", "*.json"), ("All Files", "*")]
+
+# Only objects in view, plus a margin, have canvas items. Past MAX_LIVE_ITEMS
+# objects the view shows an overview of grey blocks instead.
+MAX_LIVE_ITEMS = 4000
+VIEW_MARGIN = 200  # screen pixels beyond each edge of the view
+OVERVIEW_BLOCK = 16  # smallest overview block, in screen pixels
+OVERVIEW_COLOR = 'gray70'
+INDEX_CELL_SIZE = 200.0  # world units
+POOL_LIMIT = 1000  # hidden canvas items kept per item type for reuse
+
+# Tk's own defaults, so a recycled canvas item looks like a fresh one.
+ITEM_DEFAULTS = {
+    'rectangle': {'outline': 'black', 'fill': ''},
+    'oval': {'outline': 'black', 'fill': ''},
+    'polygon': {'outline': '', 'fill': 'black'},
+    'line': {'fill': 'black', 'arrow': tk.NONE},
+    'text': {'fill': 'black', 'text': '', 'anchor': tk.CENTER},
+}
+
+
+class EndpointGrid:
+    """Uniform grid of line endpoints used to answer snap queries."""
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.endpoints = {}  # object key -> ((x1, y1), (x2, y2))
+
+    def _cell(self, x, y):
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def update(self, item, coords):
+        self.remove(item)
+        points = ((float(coords[0]), float(coords[1])), (float(coords[2]), float(coords[3])))
+        self.endpoints[item] = points
+        for index, point in enumerate(points):
+            self.cells.setdefault(self._cell(*point), set()).add((item, index))
+
+    def remove(self, item):
+        points = self.endpoints.pop(item, None)
+        if points is None:
+            return
+        for index, point in enumerate(points):
+            cell = self._cell(*point)
+            entries = self.cells[cell]
+            entries.discard((item, index))
+            if not entries:
+                del self.cells[cell]
+
+    def nearest(self, x, y, max_distance):
+        """Return the closest endpoint strictly within max_distance, or None.
+
+        Ties resolve to the earliest created line, like a scan over the canvas.
+        """
+        min_x, min_y = self._cell(x - max_distance, y - max_distance)
+        max_x, max_y = self._cell(x + max_distance, y + max_distance)
+        candidates = []
+        if (max_x - min_x + 1) * (max_y - min_y + 1) > len(self.cells):
+            # Zoomed far out the radius spans more cells than are occupied,
+            # so walk the occupied ones instead.
+            for (cx, cy), entries in self.cells.items():
+                if min_x <= cx <= max_x and min_y <= cy <= max_y:
+                    candidates.extend(entries)
+        else:
+            for cx in range(min_x, max_x + 1):
+                for cy in range(min_y, max_y + 1):
+                    entries = self.cells.get((cx, cy))
+                    if entries:
+                        candidates.extend(entries)
+        candidates.sort()
+
+        closest_point = None
+        min_distance = max_distance
+        for item, index in candidates:
+            point = self.endpoints[item][index]
+            distance = math.sqrt((x - point[0]) ** 2 + (y - point[1]) ** 2)
+            if distance < min_distance:
+                min_distance = distance
+                closest_point = point
+        return closest_point
+
+
+class ViewTransform:
+    """Maps world coordinates to canvas coordinates: canvas = world * scale + offset."""
+
+    def __init__(self):
+        self.scale = 1.0
+        self.offset_x = 0.0
+        self.offset_y = 0.0
+
+    def to_canvas(self, coords):
+        return [c * self.scale + (self.offset_x if i % 2 == 0 else self.offset_y) for i, c in enumerate(coords)]
+
+    def to_world(self, x, y):
+        return (x - self.offset_x) / self.scale, (y - self.offset_y) / self.scale
+
+    def zoom(self, factor, x, y):
+        """Zoom by factor around the canvas point (x, y), like canvas.scale does."""
+        self.scale *= factor
+        self.offset_x = x + factor * (self.offset_x - x)
+        self.offset_y = y + factor * (self.offset_y - y)
+
+
+class CanvasObject:
+    """A diagram object kept in world coordinates.
+
+    `item` is its canvas item while the object is in or near the view, and
+    None otherwise.
+    """
+
+    __slots__ = ('item_type', 'coords', 'options', 'item')
+
+    def __init__(self, item_type, options):
+        self.item_type = item_type
+        self.coords = None
+        self.options = options
+        self.item = None
+
+    def rect(self):
+        xs, ys = self.coords[0::2], self.coords[1::2]
+        return (min(xs), min(ys), max(xs), max(ys))
+
 
 class FlowchartApp:
     def __init__(self, root):
@@ -14,10 +143,22 @@ class FlowchartApp:
         self.canvas.bind("<B1-Motion>", self.on_mouse_drag)
         self.canvas.bind("<ButtonRelease-1>", self.on_mouse_release)
         self.canvas.bind("<MouseWheel>", self.on_mouse_wheel)  # Bind the mouse wheel for zooming
+        self.canvas.bind("<Button-4>", self.on_mouse_wheel)  # X11 reports the wheel as buttons 4 and 5
+        self.canvas.bind("<Button-5>", self.on_mouse_wheel)
+        self.canvas.bind("<ButtonPress-2>", self.on_pan_start)
+        self.canvas.bind("<B2-Motion>", self.on_pan)
+        # Scrolling, zooming and resizing all change what is in view.
+        self.canvas.bind("<Configure>", self.schedule_refresh)
+        self.canvas.configure(xscrollcommand=self.schedule_refresh, yscrollcommand=self.schedule_refresh)
 
         self.menu = tk.Menu(root)
         self.root.config(menu=self.menu)
 
+        self.file_menu = tk.Menu(self.menu)
+        self.menu.add_cascade(label="File", menu=self.file_menu)
+        self.file_menu.add_command(label="Open...", command=self.open_document)
+        self.file_menu.add_command(label="Save...", command=self.save_document)
+
         self.shapes_menu = tk.Menu(self.menu)
         self.menu.add_cascade(label="Shapes", menu=self.shapes_menu)
         self.shapes_menu.add_command(label="Rectangle", command=self.select_rectangle)
@@ -35,10 +176,27 @@ class FlowchartApp:
         self.start_y = None
         self.current_item = None
         self.line_color = 'black'  # Default line color
-        self.snap_threshold = 10  # Distance threshold for snapping
+        self.snap_threshold = 10  # Distance threshold for snapping, in screen pixels
         self.snap_indicator = None
 
-        self.scale_factor = 1.0  # Scale factor for zooming
+        self.view = ViewTransform()
+        self.pending_zoom = 1.0
+        self.zoom_anchor = None
+        self.zoom_job = None
+        self.refresh_job = None
+        self.reset_objects()
+
+    def reset_objects(self):
+        self.objects = {}  # key -> CanvasObject, in creation (and stacking) order
+        self.next_key = 1
+        self.object_index = RectIndex(INDEX_CELL_SIZE)
+        self.snap_grid = EndpointGrid(self.snap_threshold)
+        self.live_keys = []  # sorted keys of objects that have a canvas item
+        self.item_pool = {}  # item type -> hidden canvas items ready for reuse
+        self.overview_items = []
+        self.materialized_region = None  # world rect the live items cover
+        self.world_bbox = None  # cached (x1, y1, x2, y2) of all objects
+        self.world_bbox_dirty = False
 
     def select_rectangle(self):
         self.current_shape = 'rectangle'
@@ -60,67 +218,300 @@ class FlowchartApp:
         if color_code:
             self.line_color = color_code[1]
 
+    def event_to_world(self, event):
+        return self.view.to_world(self.canvas.canvasx(event.x), self.canvas.canvasy(event.y))
+
+    def add_object(self, item_type, coords, **options):
+        """Add an object to the model only; it gets a canvas item when in view."""
+        key = self.next_key
+        self.next_key += 1
+        self.objects[key] = CanvasObject(item_type, {**ITEM_DEFAULTS[item_type], **options})
+        self.set_world_coords(key, coords)
+        if item_type == 'line':
+            self.snap_grid.update(key, coords)
+        return key
+
+    def create_item(self, item_type, coords, **options):
+        # Objects the user creates are under the mouse, so draw them at once.
+        key = self.add_object(item_type, coords, **options)
+        self.materialize(key)
+        return key
+
+    def move_item(self, key, coords):
+        obj = self.objects[key]
+        self.set_world_coords(key, coords)
+        if obj.item is not None:
+            self.canvas.coords(obj.item, *self.view.to_canvas(coords))
+        if key in self.snap_grid.endpoints:
+            self.snap_grid.update(key, coords)
+
+    def delete_item(self, key):
+        self.snap_grid.remove(key)
+        self.release(key)
+        self.object_index.remove(key)
+        if self.objects.pop(key, None) is not None:
+            self.world_bbox_dirty = True
+
+    def materialize(self, key):
+        obj = self.objects[key]
+        if obj.item is not None:
+            return
+        coords = self.view.to_canvas(obj.coords)
+        pool = self.item_pool.get(obj.item_type)
+        recycled = bool(pool)
+        if recycled:
+            item = pool.pop()
+            self.canvas.coords(item, *coords)
+            self.canvas.itemconfigure(item, state=tk.NORMAL, **obj.options)
+        else:
+            item = getattr(self.canvas, 'create_' + obj.item_type)(*coords, **obj.options)
+        obj.item = item
+        # Keep the creation order on screen: go just below the next newer
+        # live object, or on top if there is none.
+        index = bisect_left(self.live_keys, key)
+        if index < len(self.live_keys):
+            self.canvas.tag_lower(item, self.objects[self.live_keys[index]].item)
+        elif recycled:
+            self.canvas.tag_raise(item)
+        self.live_keys.insert(index, key)
+
+    def release(self, key):
+        """Hide the object's canvas item and keep it for reuse."""
+        obj = self.objects.get(key)
+        if obj is None or obj.item is None:
+            return
+        pool = self.item_pool.setdefault(obj.item_type, [])
+        if len(pool) < POOL_LIMIT:
+            self.canvas.itemconfigure(obj.item, state=tk.HIDDEN)
+            pool.append(obj.item)
+        else:
+            self.canvas.delete(obj.item)
+        obj.item = None
+        del self.live_keys[bisect_left(self.live_keys, key)]
+
+    def schedule_refresh(self, *args):
+        # Also the scroll command and <Configure> handler, hence *args.
+        if self.refresh_job is None:
+            self.refresh_job = self.root.after_idle(self.refresh_visible)
+
+    def visible_region(self):
+        left, top = self.canvas.canvasx(0), self.canvas.canvasy(0)
+        right, bottom = left + self.canvas.winfo_width(), top + self.canvas.winfo_height()
+        return self.view.to_world(left, top) + self.view.to_world(right, bottom)
+
+    def refresh_visible(self, force=False):
+        """Give canvas items to the objects in view plus a margin, recycling the rest.
+
+        Does nothing while the view stays inside the region covered last
+        time, unless `force` is set (the zoom changed).
+        """
+        if self.refresh_job is not None:
+            self.root.after_cancel(self.refresh_job)
+            self.refresh_job = None
+        left, top, right, bottom = self.visible_region()
+        covered = self.materialized_region
+        if (not force and covered is not None and covered[0] <= left and covered[1] <= top
+                and right <= covered[2] and bottom <= covered[3]):
+            return
+        margin = VIEW_MARGIN / self.view.scale
+        region = (left - margin, top - margin, right + margin, bottom + margin)
+        keys = self.object_index.query(region, limit=MAX_LIVE_ITEMS)
+        if keys is None:
+            self.draw_overview(region)
+            keys = set()
+        else:
+            self.draw_overview(None)
+        if self.current_item is not None:
+            keys.add(self.current_item)
+        for key in [key for key in self.live_keys if key not in keys]:
+            self.release(key)
+        for key in sorted(keys.difference(self.live_keys)):
+            self.materialize(key)
+        self.materialized_region = region
+        if self.snap_indicator:
+            self.canvas.tag_raise(self.snap_indicator)
+
+    def draw_overview(self, region):
+        """Cover each occupied part of `region` with a grey block; None clears them.
+
+        The blocks are at least OVERVIEW_BLOCK pixels wide, so their number
+        is bounded by the view size rather than by the diagram size.
+        """
+        rects = []
+        if region is not None:
+            cell_size = self.object_index.cell_size
+            block = max(cell_size, OVERVIEW_BLOCK / self.view.scale)
+            blocks = {(math.floor(cx * cell_size / block), math.floor(cy * cell_size / block))
+                      for cx, cy in self.object_index.occupied_cells(region)}
+            rects = [self.view.to_canvas((bx * block, by * block, (bx + 1) * block, (by + 1) * block)) for bx, by in blocks]
+        for item, coords in zip(self.overview_items, rects):
+            self.canvas.coords(item, *coords)
+        for coords in rects[len(self.overview_items):]:
+            self.overview_items.append(self.canvas.create_rectangle(*coords, outline='', fill=OVERVIEW_COLOR, tags='overview'))
+        for item in self.overview_items[len(rects):]:
+            self.canvas.delete(item)
+        del self.overview_items[len(rects):]
+        if rects:
+            self.canvas.tag_lower('overview')
+
+    def set_world_coords(self, key, coords):
+        obj = self.objects[key]
+        old_coords = obj.coords
+        obj.coords = coords = list(coords)
+        self.object_index.set(key, (obj.rect(),))
+        if self.world_bbox_dirty:
+            return
+        if old_coords is not None and self.world_bbox is not None and self.touches_bbox(old_coords):
+            # The item may have defined the edge of the bounding box.
+            self.world_bbox_dirty = True
+            return
+        self.extend_bbox(coords)
+
+    def touches_bbox(self, coords):
+        x1, y1, x2, y2 = self.world_bbox
+        return any(x in (x1, x2) for x in coords[0::2]) or any(y in (y1, y2) for y in coords[1::2])
+
+    def bounding_box(self):
+        if self.world_bbox_dirty:
+            self.world_bbox = None
+            self.world_bbox_dirty = False
+            for obj in self.objects.values():
+                self.extend_bbox(obj.coords)
+        return self.world_bbox
+
+    def extend_bbox(self, coords):
+        xs, ys = coords[0::2], coords[1::2]
+        if self.world_bbox is None:
+            self.world_bbox = (min(xs), min(ys), max(xs), max(ys))
+        else:
+            x1, y1, x2, y2 = self.world_bbox
+            self.world_bbox = (min(x1, *xs), min(y1, *ys), max(x2, *xs), max(y2, *ys))
+
+    def update_scrollregion(self):
+        bbox = self.bounding_box()
+        if bbox is not None:
+            self.canvas.configure(scrollregion=self.view.to_canvas(bbox))
+
+    def color_to_rgba(self, color):
+        if not color:
+            return 0
+        r, g, b = self.root.winfo_rgb(color)
+        return 0xff000000 | (r >> 8) << 16 | (g >> 8) << 8 | (b >> 8)
+
+    def rgba_to_color(self, rgba):
+        return '#%06x' % (rgba & 0xffffff) if rgba >> 24 else ''
+
+    def to_document(self):
+        document = Document()
+        for obj in self.objects.values():
+            coords, options = obj.coords, obj.options
+            if obj.item_type == 'line':
+                x1, y1, x2, y2 = coords[:4]
+                document.add_line(x1, y1, x2, y2, self.color_to_rgba(options['fill']), arrow=options['arrow'] != tk.NONE)
+            elif obj.item_type in CANVAS_SHAPE_KINDS:
+                xs, ys = coords[0::2], coords[1::2]
+                document.add_shape(CANVAS_SHAPE_KINDS[obj.item_type], min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys),
+                                   self.color_to_rgba(options['outline']), self.color_to_rgba(options['fill']))
+            elif obj.item_type == 'text':
+                x, y = coords
+                document.add_text(x, y, options['text'], self.color_to_rgba(options['fill']))
+        return document
+
+    def load_document(self, document):
+        self.canvas.delete('all')
+        self.snap_indicator = None
+        self.current_item = None
+        self.reset_objects()
+        columns = document.columns
+        for i in range(len(document)):
+            x, y, w, h = columns['shape_x'][i], columns['shape_y'][i], columns['shape_w'][i], columns['shape_h'][i]
+            options = dict(outline=self.rgba_to_color(columns['shape_stroke'][i]), fill=self.rgba_to_color(columns['shape_fill'][i]))
+            kind = SHAPE_KINDS[columns['shape_kind'][i]]
+            if kind == 'rect':
+                self.add_object('rectangle', (x, y, x + w, y + h), **options)
+            elif kind == 'ellipse':
+                self.add_object('oval', (x, y, x + w, y + h), **options)
+            else:
+                self.add_object('polygon', (x + w / 2, y, x + w, y + h / 2, x + w / 2, y + h, x, y + h / 2), **options)
+        # The Tk front end has no connector items, so connectors become plain
+        # lines between the shape centres.
+        for i in range(document.connector_count):
+            src, dst = columns['connector_src'][i], columns['connector_dst'][i]
+            coords = (columns['shape_x'][src] + columns['shape_w'][src] / 2, columns['shape_y'][src] + columns['shape_h'][src] / 2,
+                      columns['shape_x'][dst] + columns['shape_w'][dst] / 2, columns['shape_y'][dst] + columns['shape_h'][dst] / 2)
+            self.add_object('line', coords, fill=self.rgba_to_color(columns['connector_stroke'][i]))
+        for i in range(document.line_count):
+            coords = (columns['line_x1'][i], columns['line_y1'][i], columns['line_x2'][i], columns['line_y2'][i])
+            self.add_object('line', coords, fill=self.rgba_to_color(columns['line_stroke'][i]),
+                             arrow=tk.LAST if columns['line_arrow'][i] else tk.NONE)
+        for i in range(document.text_count):
+            self.add_object('text', (columns['text_x'][i], columns['text_y'][i]), text=document.text(i), anchor=tk.NW,
+                             fill=self.rgba_to_color(columns['text_color'][i]))
+        self.update_scrollregion()
+        self.refresh_visible(force=True)
+
+    def save_document(self):
+        file_path = filedialog.asksaveasfilename(title="Save Flowchart", defaultextension=".flow", filetypes=DOCUMENT_FILE_TYPES)
+        if file_path:
+            save_any(self.to_document(), file_path)
+
+    def open_document(self):
+        file_path = filedialog.askopenfilename(title="Open Flowchart", filetypes=DOCUMENT_FILE_TYPES)
+        if file_path:
+            self.load_document(load_any(file_path))
+
+    def shape_coords(self, x, y):
+        if self.current_shape == 'diamond':
+            return (self.start_x, self.start_y, x, self.start_y, (self.start_x + x) // 2, (self.start_y + y) // 2, self.start_x, y)
+        return (self.start_x, self.start_y, x, y)
+
     def on_canvas_click(self, event):
-        self.start_x, self.start_y = self.snap_to_nearest_line(event.x / self.scale_factor, event.y / self.scale_factor)
+        x, y = self.event_to_world(event)
+        self.start_x, self.start_y = self.snap_to_nearest_line(x, y)
         if self.current_shape == 'rectangle':
-            self.current_item = self.canvas.create_rectangle(self.start_x, self.start_y, event.x / self.scale_factor, event.y / self.scale_factor, outline='black', fill='lightblue')
+            self.current_item = self.create_item('rectangle', self.shape_coords(x, y), outline='black', fill='lightblue')
         elif self.current_shape in ('line', 'arrow'):
-            self.current_item = self.canvas.create_line(self.start_x, self.start_y, event.x / self.scale_factor, event.y / self.scale_factor, fill=self.line_color, arrow=tk.LAST if self.current_shape == 'arrow' else tk.NONE)
+            self.current_item = self.create_item('line', self.shape_coords(x, y), fill=self.line_color, arrow=tk.LAST if self.current_shape == 'arrow' else tk.NONE)
         elif self.current_shape == 'ellipse':
-            self.current_item = self.canvas.create_oval(self.start_x, self.start_y, event.x / self.scale_factor, event.y / self.scale_factor, outline='black', fill='lightblue')
+            self.current_item = self.create_item('oval', self.shape_coords(x, y), outline='black', fill='lightblue')
         elif self.current_shape == 'diamond':
-            self.current_item = self.canvas.create_polygon(self.start_x, self.start_y, event.x / self.scale_factor, self.start_y, (self.start_x + event.x / self.scale_factor) // 2, (self.start_y + event.y / self.scale_factor) // 2, self.start_x, event.y / self.scale_factor, outline='black', fill='lightblue')
+            self.current_item = self.create_item('polygon', self.shape_coords(x, y), outline='black', fill='lightblue')
 
     def on_mouse_drag(self, event):
-        if self.current_shape in ('line', 'arrow') and self.current_item:
-            end_x, end_y = self.snap_to_nearest_line(event.x / self.scale_factor, event.y / self.scale_factor)
-            self.canvas.coords(self.current_item, self.start_x, self.start_y, end_x, end_y)
-            self.update_snap_indicator(end_x, end_y)
-        elif self.current_shape == 'rectangle' and self.current_item:
-            self.canvas.coords(self.current_item, self.start_x, self.start_y, event.x / self.scale_factor, event.y / self.scale_factor)
-        elif self.current_shape == 'ellipse' and self.current_item:
-            self.canvas.coords(self.current_item, self.start_x, self.start_y, event.x / self.scale_factor, event.y / self.scale_factor)
-        elif self.current_shape == 'diamond' and self.current_item:
-            self.canvas.coords(self.current_item, self.start_x, self.start_y, event.x / self.scale_factor, self.start_y, (self.start_x + event.x / self.scale_factor) // 2, (self.start_y + event.y / self.scale_factor) // 2, self.start_x, event.y / self.scale_factor)
+        if not self.current_item:
+            return
+        x, y = self.event_to_world(event)
+        if self.current_shape in ('line', 'arrow'):
+            x, y = self.snap_to_nearest_line(x, y)
+            self.move_item(self.current_item, self.shape_coords(x, y))
+            self.update_snap_indicator(x, y)
+        elif self.current_shape in ('rectangle', 'ellipse', 'diamond'):
+            self.move_item(self.current_item, self.shape_coords(x, y))
 
     def on_mouse_release(self, event):
-        if self.current_shape in ('line', 'arrow') and self.current_item:
-            end_x, end_y = self.snap_to_nearest_line(event.x / self.scale_factor, event.y / self.scale_factor)
-            self.canvas.coords(self.current_item, self.start_x, self.start_y, end_x, end_y)
+        if not self.current_item:
+            return
+        x, y = self.event_to_world(event)
+        if self.current_shape in ('line', 'arrow'):
+            x, y = self.snap_to_nearest_line(x, y)
+            self.move_item(self.current_item, self.shape_coords(x, y))
             self.remove_snap_indicator()
-            self.current_item = None
-        elif self.current_shape == 'rectangle' and self.current_item:
-            self.canvas.coords(self.current_item, self.start_x, self.start_y, event.x / self.scale_factor, event.y / self.scale_factor)
-            self.current_item = None
-        elif self.current_shape == 'ellipse' and self.current_item:
-            self.canvas.coords(self.current_item, self.start_x, self.start_y, event.x / self.scale_factor, event.y / self.scale_factor)
-            self.current_item = None
-        elif self.current_shape == 'diamond' and self.current_item:
-            self.canvas.coords(self.current_item, self.start_x, self.start_y, event.x / self.scale_factor, self.start_y, (self.start_x + event.x / self.scale_factor) // 2, (self.start_y + event.y / self.scale_factor) // 2, self.start_x, event.y / self.scale_factor)
-            self.current_item = None
+        elif self.current_shape in ('rectangle', 'ellipse', 'diamond'):
+            self.move_item(self.current_item, self.shape_coords(x, y))
+        self.current_item = None
+        self.update_scrollregion()
 
     def create_rectangle(self, x, y):
         width = 100
         height = 50
-        self.canvas.create_rectangle(x, y, x + width, y + height, outline='black', fill='lightblue')
+        self.create_item('rectangle', (x, y, x + width, y + height), outline='black', fill='lightblue')
 
     def snap_to_nearest_line(self, x, y):
-        closest_point = (x, y)
-        min_distance = self.snap_threshold / self.scale_factor
-
-        for item in self.canvas.find_all():
-            if self.canvas.type(item) == 'line':
-                coords = self.canvas.coords(item)
-                points = [(coords[0], coords[1]), (coords[2], coords[3])]
-                for point in points:
-                    distance = math.sqrt((x - point[0]) ** 2 + (y - point[1]) ** 2)
-                    if distance < min_distance:
-                        min_distance = distance
-                        closest_point = point
-
-        return closest_point
+        closest_point = self.snap_grid.nearest(x, y, self.snap_threshold / self.view.scale)
+        return closest_point if closest_point is not None else (x, y)
 
     def update_snap_indicator(self, x, y):
+        x, y = self.view.to_canvas((x, y))
         if self.snap_indicator:
             self.canvas.coords(self.snap_indicator, x-5, y-5, x+5, y+5)
         else:
@@ -133,15 +524,32 @@ class FlowchartApp:
 
     def on_mouse_wheel(self, event):
         # Zoom in
-        if event.delta > 0:
-            self.scale_factor *= 1.1
+        if event.num == 4 or event.delta > 0:
+            self.pending_zoom *= 1.1
         # Zoom out
         else:
-            self.scale_factor /= 1.1
+            self.pending_zoom /= 1.1
+        self.zoom_anchor = (self.canvas.canvasx(event.x), self.canvas.canvasy(event.y))
+        # Coalesce wheel ticks into at most one rescale per frame.
+        if self.zoom_job is None:
+            self.zoom_job = self.root.after(16, self.apply_zoom)
+
+    def apply_zoom(self):
+        self.zoom_job = None
+        factor = self.pending_zoom
+        self.pending_zoom = 1.0
+        x, y = self.zoom_anchor
+        # Only the change since the last redraw is applied to the canvas items.
+        self.canvas.scale("all", x, y, factor, factor)
+        self.view.zoom(factor, x, y)
+        self.update_scrollregion()
+        self.refresh_visible(force=True)
+
+    def on_pan_start(self, event):
+        self.canvas.scan_mark(event.x, event.y)
 
-        # Rescale all objects on the canvas
-        self.canvas.scale("all", event.x, event.y, self.scale_factor, self.scale_factor)
-        self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+    def on_pan(self, event):
+        self.canvas.scan_dragto(event.x, event.y, gain=1)
 
 if __name__ == "__main__":
     root = tk.Tk()
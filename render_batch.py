@@ -0,0 +1,152 @@
+import argparse
+import math
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DOCUMENT_EXTENSIONS = ('.flow', '.json')
+
+app = None
+
+
+def initWorker():
+    # One offscreen QApplication per worker process, created before any
+    # scene is built in it.
+    global app
+    os.environ['QT_QPA_PLATFORM'] = 'offscreen'
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication(['render_batch'])
+
+
+def peakMemoryMB():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def renderSVG(scene, file_path):
+    from PyQt5.QtCore import QRectF, QSize
+    from PyQt5.QtGui import QPainter
+    from PyQt5.QtSvg import QSvgGenerator
+    from tiled_export import exportBounds
+
+    source = exportBounds(scene.itemsBoundingRect())
+    generator = QSvgGenerator()
+    generator.setFileName(file_path)
+    generator.setSize(QSize(int(source.width()), int(source.height())))
+    generator.setViewBox(QRectF(0, 0, source.width(), source.height()))
+    painter = QPainter(generator)
+    painter.setRenderHint(QPainter.Antialiasing)
+    scene.render(painter, QRectF(0, 0, source.width(), source.height()), source)
+    painter.end()
+
+
+def renderFile(input_path, output_path, output_format, scale, straight=False):
+    from document import load_any
+    from main_qt import FlowchartScene
+
+    start = time.perf_counter()
+    scene = FlowchartScene()
+    # Route connectors like the editor does, all at once rather than a
+    # frame's budget at a time.
+    scene.setOrthogonalRouting(not straight)
+    scene.route_budget = math.inf
+    document = load_any(input_path)
+    try:
+        scene.loadDocument(document)
+        scene.routePending()
+        if output_format == 'svg':
+            renderSVG(scene, output_path)
+        else:
+            scene.exportAsPNG(output_path, scale=scale)
+    finally:
+        scene.clearDiagram()
+        document.close()
+    return input_path, output_path, time.perf_counter() - start, peakMemoryMB()
+
+
+def collectInputs(paths):
+    inputs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(DOCUMENT_EXTENSIONS):
+                    inputs.append(os.path.join(path, name))
+        else:
+            inputs.append(path)
+    return inputs
+
+
+def outputPaths(inputs, output_dir, output_format):
+    """Map each input to its output file, or raise ValueError on a clash.
+
+    The output keeps the input's extension, so a.flow and a.json render to
+    a.flow.png and a.json.png.
+    """
+    outputs = {}
+    sources = {}
+    for input_path in inputs:
+        output_path = os.path.join(output_dir, f"{os.path.basename(input_path)}.{output_format}")
+        if output_path in sources:
+            raise ValueError(f"{input_path} and {sources[output_path]} would both be rendered to {output_path}")
+        sources[output_path] = input_path
+        outputs[input_path] = output_path
+    return outputs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render saved flowcharts to PNG or SVG without opening a window.")
+    parser.add_argument('inputs', nargs='+', help="diagram files, or directories of .flow/.json files")
+    parser.add_argument('-o', '--output-dir', default='.', help="directory for the rendered files")
+    parser.add_argument('-f', '--format', choices=('png', 'svg'), default='png')
+    parser.add_argument('-s', '--scale', type=float, default=1.0, help="PNG scale factor (1.0 = 96 DPI)")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument('--straight', action='store_true', help="draw connectors as straight lines instead of routing")
+    args = parser.parse_args(argv)
+
+    inputs = collectInputs(args.inputs)
+    if not inputs:
+        parser.error("no diagram files found")
+    try:
+        outputs = outputPaths(inputs, args.output_dir, args.format)
+    except ValueError as error:
+        parser.error(str(error))
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    failures = 0
+    start = time.perf_counter()
+    # Qt does not survive fork(), so every worker starts a fresh interpreter.
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=args.jobs, mp_context=context, initializer=initWorker) as pool:
+        futures = {}
+        for input_path, output_path in outputs.items():
+            future = pool.submit(renderFile, input_path, output_path, args.format, args.scale, args.straight)
+            futures[future] = input_path
+
+        for future in as_completed(futures):
+            try:
+                input_path, output_path, elapsed, peak = future.result()
+            except Exception as error:
+                failures += 1
+                print(f"FAILED {futures[future]}: {error}", file=sys.stderr)
+                continue
+            peak_text = f"{peak:.1f} MB" if peak is not None else "n/a"
+            print(f"{input_path} -> {output_path}  {elapsed * 1000:.1f} ms  worker peak RSS {peak_text}")
+
+    elapsed = time.perf_counter() - start
+    print(f"rendered {len(inputs) - failures}/{len(inputs)} files in {elapsed:.2f} s "
+          f"({(len(inputs) - failures) / elapsed:.1f} files/s, {args.jobs} workers)")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""Orthogonal connector routing around rectangular obstacles.
+
+Rects are (left, top, right, bottom) tuples and points are (x, y) tuples,
+all in scene coordinates. Nothing here depends on Qt.
+"""
+import heapq
+import math
+from bisect import bisect_left
+
+from spatial import RectIndex
+
+MAX_ROUTE_OBSTACLES = 150  # beyond this a single search gets too slow for a frame
+MAX_ROUTE_STEPS = 20000  # A* states expanded before giving up on a route
+
+
+def _expand(rect, amount):
+    return (rect[0] - amount, rect[1] - amount, rect[2] + amount, rect[3] + amount)
+
+
+def _centre(rect):
+    return ((rect[0] + rect[2]) / 2, (rect[1] + rect[3]) / 2)
+
+
+def _contains(rect, point):
+    return rect[0] < point[0] < rect[2] and rect[1] < point[1] < rect[3]
+
+
+def _trim_start(points, rect):
+    # Cut the path where it first leaves `rect`; segments are axis-aligned.
+    for index in range(len(points) - 1):
+        (ax, ay), (bx, by) = points[index], points[index + 1]
+        if _contains(rect, (bx, by)):
+            continue
+        if ay == by:
+            x = rect[2] if bx > ax else rect[0]
+            exit_point = (min(max(x, min(ax, bx)), max(ax, bx)), ay)
+        else:
+            y = rect[3] if by > ay else rect[1]
+            exit_point = (ax, min(max(y, min(ay, by)), max(ay, by)))
+        return [exit_point] + points[index + 1:]
+    return points
+
+
+def orthogonal_route(start, end, obstacles, margin=10.0, bend_penalty=30.0, max_steps=MAX_ROUTE_STEPS):
+    """Shortest Manhattan path from `start` to `end` avoiding `obstacles`.
+
+    Obstacles are grown by `margin`. The search runs A* over a sparse grid
+    whose lines are the obstacle edges and the two endpoints' coordinates,
+    which always contains a shortest rectilinear path if one exists. Each
+    bend costs `bend_penalty`. Returns the corner points, or None if the
+    endpoints are walled in or no path turned up within `max_steps`.
+    """
+    blocks = [_expand(rect, margin) for rect in obstacles]
+    if any(_contains(block, start) or _contains(block, end) for block in blocks):
+        return None
+    xs = sorted({start[0], end[0]}.union(*((block[0], block[2]) for block in blocks)))
+    ys = sorted({start[1], end[1]}.union(*((block[1], block[3]) for block in blocks)))
+    columns, rows = len(xs), len(ys)
+
+    # blocked[i][j]: the grid cell between xs[i]..xs[i + 1] and ys[j]..ys[j + 1]
+    # lies inside an obstacle. Obstacle edges are grid lines, so every cell is
+    # either wholly inside or wholly outside each obstacle.
+    blocked = [bytearray(rows) for _ in range(columns)]
+    for left, top, right, bottom in blocks:
+        for i in range(bisect_left(xs, left), bisect_left(xs, right)):
+            column = blocked[i]
+            for j in range(bisect_left(ys, top), bisect_left(ys, bottom)):
+                column[j] = 1
+
+    def cell_blocked(i, j):
+        return 0 <= i < columns - 1 and 0 <= j < rows - 1 and blocked[i][j]
+
+    # A grid segment is usable unless obstacle interior lies on both sides.
+    def step_open(i, j, di, dj):
+        if di:
+            k = i if di > 0 else i - 1
+            return not (cell_blocked(k, j - 1) and cell_blocked(k, j))
+        k = j if dj > 0 else j - 1
+        return not (cell_blocked(i - 1, k) and cell_blocked(i, k))
+
+    source = (xs.index(start[0]), ys.index(start[1]))
+    target = (xs.index(end[0]), ys.index(end[1]))
+    end_x, end_y = end
+
+    def heuristic(x, y):
+        # Manhattan distance, plus one bend unless the target is straight ahead.
+        return abs(x - end_x) + abs(y - end_y) + (bend_penalty if x != end_x and y != end_y else 0.0)
+
+    # States are (i, j, axis); axis 0 = arrived moving horizontally, 1 =
+    # vertically, 2 = at the start. Heap entries hold -cost so that among
+    # equal estimates the search goes deeper first; grids have many
+    # equally short paths and this avoids expanding all of them.
+    start_state = source + (2,)
+    best = {start_state: 0.0}
+    parent = {start_state: None}
+    heap = [(heuristic(*start), 0.0, start_state)]
+    found = None
+    while heap and max_steps:
+        max_steps -= 1
+        estimate, cost, state = heapq.heappop(heap)
+        cost = -cost
+        if cost > best.get(state, math.inf):
+            continue
+        i, j, axis = state
+        if (i, j) == target:
+            found = state
+            break
+        for di, dj, new_axis in ((1, 0, 0), (-1, 0, 0), (0, 1, 1), (0, -1, 1)):
+            ni, nj = i + di, j + dj
+            if not (0 <= ni < columns and 0 <= nj < rows) or not step_open(i, j, di, dj):
+                continue
+            new_cost = cost + abs(xs[ni] - xs[i]) + abs(ys[nj] - ys[j])
+            if axis != 2 and axis != new_axis:
+                new_cost += bend_penalty
+            new_state = (ni, nj, new_axis)
+            if new_cost < best.get(new_state, math.inf):
+                best[new_state] = new_cost
+                parent[new_state] = state
+                heapq.heappush(heap, (new_cost + heuristic(xs[ni], ys[nj]), -new_cost, new_state))
+    if found is None:
+        return None
+
+    points = []
+    state = found
+    while state is not None:
+        point = (xs[state[0]], ys[state[1]])
+        # Drop points in the middle of a straight run.
+        if len(points) >= 2 and (points[-2][0] == points[-1][0] == point[0] or points[-2][1] == points[-1][1] == point[1]):
+            points[-1] = point
+        else:
+            points.append(point)
+        state = parent[state]
+    points.reverse()
+    return points
+
+
+class ConnectorRouter:
+    """Routes connectors between obstacles and keeps the routes cached.
+
+    Obstacles and routes are both kept in RectIndex grids, routes as one
+    thin rect per segment and straight fallbacks as the area first searched,
+    so moving an obstacle finds exactly the routes it may change.
+    """
+
+    def __init__(self, margin=10.0, bend_penalty=30.0, cell_size=200.0):
+        self.margin = margin
+        self.bend_penalty = bend_penalty
+        self.obstacles = RectIndex(cell_size)
+        self.routes = RectIndex(cell_size)
+        self.paths = {}
+
+    def set_obstacle(self, key, rect):
+        """Add or move an obstacle; returns the route keys it may affect."""
+        old = self.obstacles.rects(key)
+        if old == (rect,):
+            return set()
+        self.obstacles.set(key, (rect,))
+        affected = self.routes.query(_expand(rect, self.margin))
+        for old_rect in old:
+            affected |= self.routes.query(_expand(old_rect, self.margin))
+        return affected
+
+    def remove_obstacle(self, key):
+        affected = set()
+        for old_rect in self.obstacles.rects(key):
+            affected |= self.routes.query(_expand(old_rect, self.margin))
+        self.obstacles.remove(key)
+        return affected
+
+    def route(self, key, start_rect, end_rect, ignore=()):
+        """Route between the centres of two rects, ignoring `ignore` obstacles.
+
+        The path is trimmed to start and end on the rects' borders. The
+        search first looks at obstacles near the endpoints and widens the
+        area if that finds no path, or one that leaves the area. Returns the
+        cached corner points, or None if no route inside the searched area
+        was found and a straight line should be drawn.
+        """
+        start, end = _centre(start_rect), _centre(end_rect)
+        padding = 4 * self.margin
+        span = max(abs(end[0] - start[0]), abs(end[1] - start[1]))
+        path = None
+        for attempt in range(2):
+            region = (min(start[0], end[0]) - padding, min(start[1], end[1]) - padding,
+                      max(start[0], end[0]) + padding, max(start[1], end[1]) + padding)
+            if attempt == 0:
+                first_region = region
+            keys = self.obstacles.query(region).difference(ignore)
+            if len(keys) > MAX_ROUTE_OBSTACLES:
+                path = None
+                break
+            path = orthogonal_route(start, end, [self.obstacles.rects(other)[0] for other in keys],
+                                    self.margin, self.bend_penalty)
+            # Obstacles outside the region were not considered, so only
+            # accept a path that stays inside it.
+            if path is not None and all(_contains(_expand(region, 1), point) for point in path):
+                break
+            padding += span + 10 * self.margin
+        else:
+            path = None  # no attempt found a path inside its region
+        if path is not None:
+            path = _trim_start(path, start_rect)
+            path.reverse()
+            path = _trim_start(path, end_rect)
+            path.reverse()
+            self.set_route(key, path)
+        else:
+            # The obstacles near the endpoints decided that there is no
+            # route, so index the straight fallback by that area; moving
+            # any of them queues another try.
+            self.paths.pop(key, None)
+            self.routes.set(key, [first_region])
+        return path
+
+    def set_route(self, key, path):
+        if path is None:
+            self.forget(key)
+            return
+        self.paths[key] = path
+        self.routes.set(key, [(min(a[0], b[0]), min(a[1], b[1]), max(a[0], b[0]), max(a[1], b[1]))
+                              for a, b in zip(path, path[1:])])
+
+    def forget(self, key):
+        self.paths.pop(key, None)
+        self.routes.remove(key)
+
+    def clear(self):
+        self.obstacles.clear()
+        self.routes.clear()
+        self.paths.clear()
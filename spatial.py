@@ -0,0 +1,88 @@
+"""Uniform-grid spatial index over axis-aligned rects.
+
+Rects are (left, top, right, bottom) tuples. Used by the connector router
+and by the Tk front end to find the objects in view.
+"""
+import math
+
+
+def _intersects(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class RectIndex:
+    """Uniform grid over rects; each key owns one or more rects."""
+
+    def __init__(self, cell_size=200.0):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.rects_by_key = {}
+
+    def _cells(self, rect):
+        size = self.cell_size
+        for cx in range(math.floor(rect[0] / size), math.floor(rect[2] / size) + 1):
+            for cy in range(math.floor(rect[1] / size), math.floor(rect[3] / size) + 1):
+                yield cx, cy
+
+    def set(self, key, rects):
+        self.remove(key)
+        rects = tuple(rects)
+        self.rects_by_key[key] = rects
+        for rect in rects:
+            for cell in self._cells(rect):
+                self.cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key):
+        for rect in self.rects_by_key.pop(key, ()):
+            for cell in self._cells(rect):
+                keys = self.cells.get(cell)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self.cells[cell]
+
+    def _cells_in(self, rect):
+        # Like _cells, but walks the occupied cells instead when there are
+        # fewer of them, so a huge query rect stays cheap.
+        size = self.cell_size
+        x0, x1 = math.floor(rect[0] / size), math.floor(rect[2] / size)
+        y0, y1 = math.floor(rect[1] / size), math.floor(rect[3] / size)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self.cells):
+            return [cell for cell in self.cells if x0 <= cell[0] <= x1 and y0 <= cell[1] <= y1]
+        return self._cells(rect)
+
+    def rects(self, key):
+        return self.rects_by_key.get(key, ())
+
+    def query(self, rect, limit=None):
+        """Keys with at least one rect intersecting `rect` (edges included).
+
+        With a `limit`, returns None instead once more keys than that match.
+        """
+        size = self.cell_size
+        candidates = set()
+        inside = set()  # keys of cells wholly inside `rect` match for certain
+        for cell in self._cells_in(rect):
+            keys = self.cells.get(cell)
+            if not keys:
+                continue
+            if (limit is not None and rect[0] <= cell[0] * size and (cell[0] + 1) * size <= rect[2]
+                    and rect[1] <= cell[1] * size and (cell[1] + 1) * size <= rect[3]):
+                inside.update(keys)
+                if len(inside) > limit:
+                    return None
+            else:
+                candidates.update(keys)
+        candidates.difference_update(inside)
+        inside.update(key for key in candidates if any(_intersects(rect, own) for own in self.rects_by_key[key]))
+        if limit is not None and len(inside) > limit:
+            return None
+        return inside
+
+    def occupied_cells(self, rect):
+        """The non-empty grid cells, as (column, row), overlapping `rect`."""
+        return [cell for cell in self._cells_in(rect) if cell in self.cells]
+
+    def clear(self):
+        self.cells.clear()
+        self.rects_by_key.clear()
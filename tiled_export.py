@@ -0,0 +1,229 @@
+import math
+import os
+import struct
+import zlib
+from collections import namedtuple
+
+from PyQt5.QtCore import Qt, QLineF, QPointF, QRectF, QThread, pyqtSignal
+from PyQt5.QtGui import QColor, QFont, QImage, QPainter, QPen, QPolygonF
+from PyQt5.QtWidgets import QGraphicsEllipseItem, QGraphicsLineItem, QGraphicsPolygonItem, QGraphicsRectItem, QGraphicsTextItem
+
+SCREEN_DPI = 96
+EXPORT_MARGIN = 10
+
+
+class PNGStreamWriter:
+    """Writes an 8-bit RGB PNG one block of scanlines at a time."""
+
+    def __init__(self, file_path, width, height, dpi=SCREEN_DPI):
+        self.file = open(file_path, 'wb')
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.compressor = zlib.compressobj(6)
+
+        self.file.write(b'\x89PNG\r\n\x1a\n')
+        self.writeChunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        pixels_per_meter = round(dpi / 0.0254)
+        self.writeChunk(b'pHYs', struct.pack('>IIB', pixels_per_meter, pixels_per_meter, 1))
+
+    def writeChunk(self, kind, data):
+        self.file.write(struct.pack('>I', len(data)))
+        self.file.write(kind)
+        self.file.write(data)
+        self.file.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind))))
+
+    def writeRows(self, image, rows):
+        """Append the first `rows` scanlines of an RGB888 QImage."""
+        row_bytes = self.width * 3
+        stride = image.bytesPerLine()
+        ptr = image.constBits()
+        ptr.setsize(stride * image.height())
+        data = memoryview(ptr)
+
+        compressed = []
+        for y in range(rows):
+            compressed.append(self.compressor.compress(b'\x00'))  # filter type None
+            compressed.append(self.compressor.compress(data[y * stride:y * stride + row_bytes]))
+        compressed = b''.join(compressed)
+        if compressed:
+            self.writeChunk(b'IDAT', compressed)
+        self.rows_written += rows
+
+    def close(self):
+        self.writeChunk(b'IDAT', self.compressor.flush())
+        self.writeChunk(b'IEND', b'')
+        self.file.close()
+
+    def abort(self):
+        """Close and remove the partial file, also after a failed write."""
+        try:
+            self.file.close()
+        except OSError:
+            pass  # e.g. the disk is full; the file goes anyway
+        if os.path.exists(self.file.name):
+            os.remove(self.file.name)
+
+
+def exportTiled(source, paint, file_path, scale=1.0, tile_size=512, memory_budget=32 * 1024 * 1024, progress=None):
+    """Render the scene rect `source` to a PNG in horizontal tiles.
+
+    `paint(painter, rect)` draws the scene area `rect` in scene coordinates.
+    Only one tile is held in memory at a time: it spans the full image width
+    and is `tile_size` rows tall, or fewer rows if that would exceed
+    `memory_budget` bytes. `progress(rows_done, total_rows)` is called after
+    each tile; returning False cancels the export and removes the file.
+    Returns True if the file was written. If rendering or writing fails, the
+    partial file is removed and the exception propagates.
+    """
+    width = max(1, math.ceil(source.width() * scale))
+    height = max(1, math.ceil(source.height() * scale))
+    tile_rows = max(1, min(tile_size, memory_budget // (width * 3)))
+
+    tile = QImage(width, tile_rows, QImage.Format_RGB888)
+    writer = PNGStreamWriter(file_path, width, height, dpi=SCREEN_DPI * scale)
+    try:
+        for top in range(0, height, tile_rows):
+            rows = min(tile_rows, height - top)
+            tile.fill(Qt.white)
+            painter = QPainter(tile)
+            try:
+                painter.setRenderHint(QPainter.Antialiasing)
+                painter.scale(scale, scale)
+                tile_rect = QRectF(source.left(), source.top() + top / scale, width / scale, tile_rows / scale)
+                painter.translate(-tile_rect.topLeft())
+                painter.setClipRect(tile_rect)
+                paint(painter, tile_rect)
+            finally:
+                painter.end()
+            writer.writeRows(tile, rows)
+
+            if progress is not None and progress(top + rows, height) is False:
+                writer.abort()
+                return False
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    return True
+
+
+def exportBounds(rect):
+    return rect.adjusted(-EXPORT_MARGIN, -EXPORT_MARGIN, EXPORT_MARGIN, EXPORT_MARGIN)
+
+
+def exportSceneTiled(scene, file_path, scale=1.0, tile_size=512, memory_budget=32 * 1024 * 1024, progress=None):
+    """Render the items of `scene` to a PNG on the calling thread."""
+    return exportTiled(exportBounds(scene.itemsBoundingRect()),
+                       lambda painter, rect: scene.render(painter, rect, rect),
+                       file_path, scale, tile_size, memory_budget, progress)
+
+
+SceneSnapshot = namedtuple('SceneSnapshot', 'bounds items')
+
+
+def snapshotScene(scene):
+    """Copy what the export needs out of `scene` into plain immutable tuples.
+
+    Each entry is (kind, bounds, geometry, style) in painting order, where
+    bounds and geometry are float tuples in scene coordinates.
+    """
+    items = []
+    for item in scene.items(Qt.AscendingOrder):
+        if not item.isVisible():
+            continue
+        rect = item.sceneBoundingRect()
+        bounds = (rect.left(), rect.top(), rect.right(), rect.bottom())
+        if isinstance(item, QGraphicsTextItem):
+            pos = item.scenePos()
+            style = (item.defaultTextColor().rgba(), item.font().toString(), item.document().documentMargin())
+            items.append(('text', bounds, (pos.x(), pos.y(), item.toPlainText()), style))
+            continue
+        pen = item.pen()
+        pen_style = (pen.color().rgba(), pen.widthF())
+        route = getattr(item, 'route', None)  # orthogonally routed connectors
+        if route:
+            items.append(('polyline', bounds, tuple(route), pen_style))
+        elif isinstance(item, QGraphicsLineItem):
+            line = item.line()
+            p1, p2 = item.mapToScene(line.p1()), item.mapToScene(line.p2())
+            items.append(('line', bounds, (p1.x(), p1.y(), p2.x(), p2.y()), pen_style))
+        elif isinstance(item, (QGraphicsRectItem, QGraphicsEllipseItem)):
+            shape_rect = item.mapRectToScene(item.rect())
+            brush = item.brush()
+            fill = brush.color().rgba() if brush.style() != Qt.NoBrush else None
+            kind = 'ellipse' if isinstance(item, QGraphicsEllipseItem) else 'rect'
+            items.append((kind, bounds, (shape_rect.x(), shape_rect.y(), shape_rect.width(), shape_rect.height()),
+                          pen_style + (fill,)))
+        elif isinstance(item, QGraphicsPolygonItem):
+            polygon = item.mapToScene(item.polygon())
+            brush = item.brush()
+            fill = brush.color().rgba() if brush.style() != Qt.NoBrush else None
+            items.append(('polygon', bounds, tuple((point.x(), point.y()) for point in polygon), pen_style + (fill,)))
+    return SceneSnapshot(bounds=exportBounds(scene.itemsBoundingRect()), items=tuple(items))
+
+
+def paintSnapshot(painter, snapshot, rect):
+    """Draw the entries of `snapshot` intersecting the scene rect `rect`."""
+    left, top, right, bottom = rect.left(), rect.top(), rect.right(), rect.bottom()
+    for kind, bounds, geometry, style in snapshot.items:
+        if bounds[2] < left or bounds[0] > right or bounds[3] < top or bounds[1] > bottom:
+            continue
+        if kind == 'text':
+            color, font_description, margin = style
+            font = QFont()
+            font.fromString(font_description)
+            painter.setFont(font)
+            painter.setPen(QColor.fromRgba(color))
+            x, y, text = geometry
+            painter.drawText(QRectF(x + margin, y + margin, bounds[2] - bounds[0], bounds[3] - bounds[1]),
+                             Qt.AlignLeft | Qt.AlignTop, text)
+            continue
+        painter.setPen(QPen(QColor.fromRgba(style[0]), style[1]))
+        if kind == 'line':
+            painter.drawLine(QLineF(*geometry))
+            continue
+        if kind == 'polyline':
+            painter.drawPolyline(QPolygonF([QPointF(x, y) for x, y in geometry]))
+            continue
+        fill = style[2]
+        painter.setBrush(QColor.fromRgba(fill) if fill is not None else Qt.NoBrush)
+        if kind == 'polygon':
+            painter.drawPolygon(QPolygonF([QPointF(x, y) for x, y in geometry]))
+        elif kind == 'ellipse':
+            painter.drawEllipse(QRectF(*geometry))
+        else:
+            painter.drawRect(QRectF(*geometry))
+
+
+class ExportWorker(QThread):
+    """Renders a SceneSnapshot to a PNG off the GUI thread."""
+
+    progress = pyqtSignal(int, int)
+    done = pyqtSignal(bool)
+
+    def __init__(self, snapshot, file_path, scale=1.0, parent=None):
+        super().__init__(parent)
+        self.snapshot = snapshot
+        self.file_path = file_path
+        self.scale = scale
+        self.cancelled = False
+        self.error = None  # the exception that stopped the export, if any
+
+    def cancel(self):
+        self.cancelled = True
+
+    def reportProgress(self, rows_done, total_rows):
+        self.progress.emit(rows_done, total_rows)
+        return not self.cancelled
+
+    def run(self):
+        # done must always be emitted, or the editor keeps waiting for it.
+        try:
+            written = exportTiled(self.snapshot.bounds,
+                                  lambda painter, rect: paintSnapshot(painter, self.snapshot, rect),
+                                  self.file_path, self.scale, progress=self.reportProgress)
+        except Exception as error:
+            self.error = error
+            written = False
+        self.done.emit(written)